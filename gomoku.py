@@ -1,111 +1,42 @@
+import argparse
+import os
+import threading
 import tkinter as tk
 from tkinter import messagebox
 
-BOARD_SIZE = 15
+from gomoku_book import BOOK_PATH, OpeningBook
+from gomoku_engine import (
+    AI, BOARD_SIZE, FREESTYLE, HUMAN, MAX_SEARCH_DEPTH, MOVE_TIME, RULES, Bitboard, Engine,
+)
+
 CELL_SIZE = 40
 PADDING = 30
 STONE_RADIUS = 16
 
-WIDTH = CELL_SIZE * (BOARD_SIZE - 1) + PADDING * 2
-HEIGHT = CELL_SIZE * (BOARD_SIZE - 1) + PADDING * 2
-
-HUMAN = 1   # 黑棋
-AI = 2      # 白棋
-
-# 棋型评分表
-SCORE = {
-    (5, True):  1_000_000,   # 五连
-    (4, True):    50_000,    # 活四
-    (4, False):   10_000,    # 冲四
-    (3, True):     2_000,    # 活三
-    (3, False):      500,    # 眠三
-    (2, True):       100,    # 活二
-    (2, False):       20,    # 眠二
-}
-
-
-def evaluate_line(board, player, row, col, dr, dc):
-    """评估从 (row,col) 出发某方向上的棋型分数"""
-    count = 1
-    blocked = 0
-
-    for sign in (1, -1):
-        r, c = row + sign * dr, col + sign * dc
-        while 0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE and board[r][c] == player:
-            count += 1
-            r += sign * dr
-            c += sign * dc
-        # 检查端点是否被堵住
-        if not (0 <= r < BOARD_SIZE and 0 <= c < BOARD_SIZE) or board[r][c] != 0:
-            blocked += 1
-
-    if count >= 5:
-        return SCORE[(5, True)]
-    alive = blocked < 2
-    return SCORE.get((count, alive), 0)
-
-
-def score_position(board, row, col, player):
-    """计算某位置落子后的综合分数"""
-    directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-    total = 0
-    for dr, dc in directions:
-        total += evaluate_line(board, player, row, col, dr, dc)
-    return total
-
-
-def ai_move(board):
-    """AI选择最佳落子位置（启发式评分）"""
-    best_score = -1
-    best_pos = None
-
-    # 若棋盘全空，走天元
-    if all(board[r][c] == 0 for r in range(BOARD_SIZE) for c in range(BOARD_SIZE)):
-        return BOARD_SIZE // 2, BOARD_SIZE // 2
-
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            if board[r][c] != 0:
-                continue
-            # 只考虑有邻居的位置（剪枝）
-            has_neighbor = any(
-                0 <= r + dr < BOARD_SIZE and 0 <= c + dc < BOARD_SIZE
-                and board[r + dr][c + dc] != 0
-                for dr in (-1, 0, 1) for dc in (-1, 0, 1)
-                if (dr, dc) != (0, 0)
-            )
-            if not has_neighbor:
-                continue
-
-            board[r][c] = AI
-            ai_s = score_position(board, r, c, AI)
-            board[r][c] = 0
-
-            board[r][c] = HUMAN
-            human_s = score_position(board, r, c, HUMAN)
-            board[r][c] = 0
-
-            # AI进攻权重略高于防守
-            s = ai_s * 1.1 + human_s
-            if s > best_score:
-                best_score = s
-                best_pos = (r, c)
-
-    return best_pos
-
 
 class Gomoku:
-    def __init__(self, root):
+    def __init__(self, root, size=BOARD_SIZE, rule=FREESTYLE, ponder=True):
         self.root = root
         self.root.title("五子棋 - 人机对战")
         self.root.resizable(False, False)
 
-        self.board = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        self.size = size
+        self.rule = rule
+        self.board = Bitboard(size, rule)
         self.current_player = HUMAN
         self.game_over = False
+        # 开局库只读、按需映射，整个窗口共用一份
+        self.book = OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else None
+        self.engine = Engine(MAX_SEARCH_DEPTH, MOVE_TIME, book=self.book)
+        self.search_stop = None
+        # 轮到玩家时在后台预判其应对并提前搜索，玩家落子时停下
+        self.ponder = ponder
+        self.ponder_stop = None
+        self.ponder_thread = None
 
         self._build_ui()
         self._draw_board()
+        self._start_ponder()
 
     def _build_ui(self):
         top = tk.Frame(self.root, bg="#d4a84b", pady=6)
@@ -119,7 +50,8 @@ class Gomoku:
                   command=self.restart, bg="#8b4513", fg="white",
                   relief=tk.FLAT, padx=10).pack(side=tk.RIGHT, padx=12)
 
-        self.canvas = tk.Canvas(self.root, width=WIDTH, height=HEIGHT,
+        side = CELL_SIZE * (self.size - 1) + PADDING * 2
+        self.canvas = tk.Canvas(self.root, width=side, height=side,
                                 bg="#d4a84b", highlightthickness=0)
         self.canvas.pack()
         self.canvas.bind("<Button-1>", self.on_click)
@@ -129,14 +61,15 @@ class Gomoku:
 
     def _draw_board(self):
         self.canvas.delete("grid")
-        for i in range(BOARD_SIZE):
+        end = PADDING + (self.size - 1) * CELL_SIZE
+        for i in range(self.size):
             x = PADDING + i * CELL_SIZE
             y = PADDING + i * CELL_SIZE
-            self.canvas.create_line(PADDING, y, PADDING + (BOARD_SIZE - 1) * CELL_SIZE, y,
+            self.canvas.create_line(PADDING, y, end, y,
                                     fill="#8b6914", width=1, tags="grid")
-            self.canvas.create_line(x, PADDING, x, PADDING + (BOARD_SIZE - 1) * CELL_SIZE,
+            self.canvas.create_line(x, PADDING, x, end,
                                     fill="#8b6914", width=1, tags="grid")
-        star_points = [3, 7, 11]
+        star_points = [3, self.size // 2, self.size - 4]
         for r in star_points:
             for c in star_points:
                 cx = PADDING + c * CELL_SIZE
@@ -150,7 +83,7 @@ class Gomoku:
         return row, col
 
     def _is_valid(self, row, col):
-        return 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE
+        return 0 <= row < self.size and 0 <= col < self.size
 
     def _draw_stone(self, row, col, player, tag="stone"):
         cx = PADDING + col * CELL_SIZE
@@ -167,7 +100,7 @@ class Gomoku:
         if self.game_over or self.current_player != HUMAN:
             return
         row, col = self._pixel_to_grid(event.x, event.y)
-        if not self._is_valid(row, col) or self.board[row][col] != 0:
+        if not self._is_valid(row, col) or self.board.get(row, col) != 0:
             self.canvas.delete("hover")
             self.hover_item = None
             return
@@ -183,14 +116,18 @@ class Gomoku:
         if self.game_over or self.current_player != HUMAN:
             return
         row, col = self._pixel_to_grid(event.x, event.y)
-        if not self._is_valid(row, col) or self.board[row][col] != 0:
+        if not self._is_valid(row, col) or self.board.get(row, col) != 0:
+            return
+        if self.board.is_forbidden(row, col):
+            self.status_var.set("禁手，请换个位置")
             return
 
         self.canvas.delete("hover")
+        self._stop_ponder()
         self._place(row, col, HUMAN)
 
     def _place(self, row, col, player):
-        self.board[row][col] = player
+        self.board.place(row, col, player)
         self._draw_stone(row, col, player)
 
         if self._check_win(row, col):
@@ -214,61 +151,87 @@ class Gomoku:
             self.root.after(100, self._ai_turn)
         else:
             self.status_var.set("轮到你落子（黑棋）")
+            self._start_ponder()
+
+    def _start_ponder(self):
+        if not self.ponder or self.game_over:
+            return
+        self.ponder_stop = threading.Event()
+        self.ponder_thread = threading.Thread(target=self.engine.ponder,
+                                              args=(self.board.copy(), HUMAN, self.ponder_stop),
+                                              daemon=True)
+        self.ponder_thread.start()
+
+    def _stop_ponder(self):
+        # 只发停止信号；线程可能还在收尾，由 _ai_turn 交给搜索线程去等
+        if self.ponder_stop is not None:
+            self.ponder_stop.set()
+            self.ponder_stop = None
 
     def _ai_turn(self):
-        pos = ai_move(self.board)
+        # 在后台线程里搜索，界面保持响应；重新开始时通过 stop 取消
+        self.search_stop = threading.Event()
+        ponder_thread, self.ponder_thread = self.ponder_thread, None
+        threading.Thread(target=self._search,
+                         args=(self.board.copy(), self.engine, self.search_stop, ponder_thread),
+                         daemon=True).start()
+
+    def _search(self, board, engine, stop, ponder_thread=None):
+        # 预判线程和搜索共用置换表，等它停下再开始；命中预判时 move 立即返回
+        if ponder_thread is not None:
+            ponder_thread.join()
+        pos = engine.move(board, AI, stop)
+        if not stop.is_set():
+            self.root.after(0, self._ai_done, pos, stop)
+
+    def _ai_done(self, pos, stop):
+        if stop.is_set() or self.game_over:
+            return
+        self.search_stop = None
         if pos:
             self._place(pos[0], pos[1], AI)
 
+    def _cancel_search(self):
+        if self.search_stop is not None:
+            self.search_stop.set()
+            self.search_stop = None
+
     def _check_win(self, row, col):
-        player = self.board[row][col]
-        directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-        for dr, dc in directions:
-            count = 1
-            for sign in (1, -1):
-                r, c = row + sign * dr, col + sign * dc
-                while self._is_valid(r, c) and self.board[r][c] == player:
-                    count += 1
-                    r += sign * dr
-                    c += sign * dc
-            if count >= 5:
-                return True
-        return False
+        return self.board.winning_line(row, col) is not None
 
     def _highlight_winner(self, row, col):
-        player = self.board[row][col]
-        directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
-        for dr, dc in directions:
-            cells = [(row, col)]
-            for sign in (1, -1):
-                r, c = row + sign * dr, col + sign * dc
-                while self._is_valid(r, c) and self.board[r][c] == player:
-                    cells.append((r, c))
-                    r += sign * dr
-                    c += sign * dc
-            if len(cells) >= 5:
-                for r, c in cells:
-                    cx = PADDING + c * CELL_SIZE
-                    cy = PADDING + r * CELL_SIZE
-                    self.canvas.create_oval(cx - 6, cy - 6, cx + 6, cy + 6,
-                                            fill="red", outline="", tags="stone")
-                break
+        for r, c in self.board.winning_line(row, col) or []:
+            cx = PADDING + c * CELL_SIZE
+            cy = PADDING + r * CELL_SIZE
+            self.canvas.create_oval(cx - 6, cy - 6, cx + 6, cy + 6,
+                                    fill="red", outline="", tags="stone")
 
     def _check_draw(self):
-        return all(self.board[r][c] != 0
-                   for r in range(BOARD_SIZE) for c in range(BOARD_SIZE))
+        return self.board.is_full()
 
     def restart(self):
-        self.board = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        self._cancel_search()
+        self._stop_ponder()
+        self.ponder_thread = None
+        self.board = Bitboard(self.size, self.rule)
+        self.engine.close()
+        self.engine = Engine(MAX_SEARCH_DEPTH, MOVE_TIME, book=self.book)
         self.current_player = HUMAN
         self.game_over = False
         self.canvas.delete("stone")
         self.canvas.delete("hover")
         self.hover_item = None
         self.status_var.set("你先行（黑棋）")
+        self._start_ponder()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="五子棋人机对战")
+    parser.add_argument("--size", type=int, default=BOARD_SIZE, help="棋盘边长，如 15、19")
+    parser.add_argument("--rule", choices=RULES, default=FREESTYLE, help="规则")
+    parser.add_argument("--no-ponder", action="store_true", help="关闭玩家思考时的后台预判")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    Gomoku(root)
+    Gomoku(root, args.size, args.rule, ponder=not args.no_ponder)
     root.mainloop()
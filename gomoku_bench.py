@@ -0,0 +1,165 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+from gomoku_book import OpeningBook
+from gomoku_engine import AI, BOARD_SIZE, FREESTYLE, HUMAN, RULES, Bitboard, Engine, order_moves
+
+# 配置串里允许的键及其对应的 Engine 参数
+CONFIG_KEYS = {
+    "depth": ("depth", int),
+    "time": ("time_limit", float),
+    "width": ("width", int),
+    "workers": ("workers", int),
+    "threat": ("threat_nodes", int),
+    "numpy": ("vectorized", lambda v: v.lower() in ("1", "true", "yes")),
+    "book": ("book", OpeningBook),
+}
+
+
+def parse_config(text):
+    """把 "depth=4,time=0.5" 这样的配置串解析成 Engine 的关键字参数"""
+    kwargs = {}
+    for item in filter(None, text.split(",")):
+        key, _, value = item.partition("=")
+        if key not in CONFIG_KEYS:
+            raise ValueError(f"未知配置项 {key!r}，可用：{', '.join(CONFIG_KEYS)}")
+        name, cast = CONFIG_KEYS[key]
+        kwargs[name] = cast(value)
+    return kwargs
+
+
+def play_game(engines, stats, rng, opening, size=BOARD_SIZE, rule=FREESTYLE):
+    """下一局自对弈，engines 为 {HUMAN: 名字, AI: 名字}，返回胜者名字，和棋返回 None"""
+    board = Bitboard(size, rule)
+    player = HUMAN
+    for name in engines.values():
+        stats[name]["engine"].new_game()
+
+    while not board.is_full():
+        name = engines[player]
+        if board.count < opening:
+            # 开局几手在启发式前几名里随机挑，避免每局都一样
+            moves = order_moves(board, player, 3) or [(board.size // 2, board.size // 2)]
+            move = rng.choice(moves)
+        else:
+            engine = stats[name]["engine"]
+            move = engine.move(board, player)
+            s = stats[name]
+            s["moves"] += 1
+            s["nodes"] += engine.last["nodes"]
+            s["time"] += engine.last["time"]
+            s["max_time"] = max(s["max_time"], engine.last["time"])
+            s["book"] += engine.last["source"] == "book"
+            if engine.last["source"] == "search":
+                s["searches"] += 1
+                s["depth"] += engine.last["depth"]
+        if move is None:
+            return None  # 黑棋只剩禁手可下
+        board.place(move[0], move[1], player)
+        if board.is_win(move[0], move[1]):
+            return name
+        player = AI if player == HUMAN else HUMAN
+    return None
+
+
+def summarize(stats, games, draws):
+    results = {}
+    for name, s in stats.items():
+        results[name] = {
+            "config": s["config"],
+            "wins": s["wins"],
+            "win_rate": s["wins"] / games if games else 0.0,
+            "moves": s["moves"],
+            "nodes_per_sec": s["nodes"] / s["time"] if s["time"] else 0.0,
+            "ms_per_move": 1000 * s["time"] / s["moves"] if s["moves"] else 0.0,
+            "max_ms_per_move": 1000 * s["max_time"],
+            "avg_depth": s["depth"] / s["searches"] if s["searches"] else 0.0,
+            "book_moves": s["book"],
+        }
+    return {"games": games, "draws": draws, "results": results}
+
+
+def print_report(report):
+    print(f"对局数 {report['games']}，和棋 {report['draws']}")
+    print(f"{'':3}{'配置':<28}{'胜率':>8}{'节点/秒':>10}{'毫秒/步':>10}{'最长':>10}{'平均深度':>10}")
+    for name, r in report["results"].items():
+        print(f"{name:3}{r['config']:<28}{r['win_rate']:>8.1%}{r['nodes_per_sec']:>10.0f}"
+              f"{r['ms_per_move']:>10.1f}{r['max_ms_per_move']:>10.1f}{r['avg_depth']:>10.2f}")
+
+
+def compare(report, baseline, tolerance):
+    """与基线对比，节点/秒下降或每步耗时上升超过 tolerance 视为退化，返回退化项列表"""
+    regressions = []
+    if (baseline.get("size"), baseline.get("rule")) != (report["size"], report["rule"]):
+        print("棋盘大小或规则与基线不同，跳过对比")
+        return regressions
+    for name, r in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or base["config"] != r["config"]:
+            continue
+        if r["nodes_per_sec"] < base["nodes_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name} 节点/秒 {base['nodes_per_sec']:.0f} -> {r['nodes_per_sec']:.0f}")
+        if r["ms_per_move"] > base["ms_per_move"] * (1 + tolerance):
+            regressions.append(f"{name} 毫秒/步 {base['ms_per_move']:.1f} -> {r['ms_per_move']:.1f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="五子棋引擎自对弈基准测试")
+    parser.add_argument("-n", "--games", type=int, default=10, help="对局数，双方轮流执黑")
+    parser.add_argument("-a", default="depth=4", help="引擎 A 的配置，如 depth=4,time=0.5,width=12")
+    parser.add_argument("-b", default="depth=2", help="引擎 B 的配置")
+    parser.add_argument("--opening", type=int, default=4, help="开局随机走的手数")
+    parser.add_argument("--size", type=int, default=BOARD_SIZE, help="棋盘边长")
+    parser.add_argument("--rule", choices=RULES, default=FREESTYLE, help="规则")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", metavar="JSON", help="把结果写成基线文件")
+    parser.add_argument("--compare", metavar="JSON", help="与基线文件对比，退化时返回非零")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="允许的相对退化幅度")
+    args = parser.parse_args(argv)
+
+    stats = {}
+    for name, config in (("A", args.a), ("B", args.b)):
+        stats[name] = {"config": config, "engine": Engine(**parse_config(config)),
+                       "wins": 0, "moves": 0, "nodes": 0, "time": 0.0, "max_time": 0.0,
+                       "searches": 0, "depth": 0, "book": 0}
+
+    rng = random.Random(args.seed)
+    draws = 0
+    start = time.perf_counter()
+    try:
+        for game in range(args.games):
+            black, white = ("A", "B") if game % 2 == 0 else ("B", "A")
+            winner = play_game({HUMAN: black, AI: white}, stats, rng, args.opening,
+                               args.size, args.rule)
+            if winner is None:
+                draws += 1
+            else:
+                stats[winner]["wins"] += 1
+            print(f"第 {game + 1} 局：黑 {black} 白 {white}，{'和棋' if winner is None else winner + ' 胜'}")
+    finally:
+        for entry in stats.values():
+            entry["engine"].close()
+
+    report = summarize(stats, args.games, draws)
+    report.update(size=args.size, rule=args.rule, elapsed=time.perf_counter() - start)
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print("退化：" + line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from functools import lru_cache
+
+from gomoku_engine import (
+    AI, BOARD_SIZE, FREESTYLE, HUMAN, RULES, SIDE_KEY, Bitboard, Engine, _zobrist, order_moves,
+)
+
+# 文件头：魔数、版本、边长、规则编号、记录数；之后是按键升序排列的定长记录
+MAGIC = b"GMKB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBxI")
+# 记录：规范化后的局面键（含行棋方）、规范朝向下的落子行列
+RECORD = struct.Struct("<QBBxx")
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gomoku_book.bin")
+
+
+@lru_cache(maxsize=None)
+def _symmetries(size):
+    """棋盘的 8 种对称变换，每种是 cell -> 变换后 cell 的映射表"""
+    n = size - 1
+    transforms = [
+        lambda r, c: (r, c),
+        lambda r, c: (c, n - r),
+        lambda r, c: (n - r, n - c),
+        lambda r, c: (n - c, r),
+        lambda r, c: (r, n - c),
+        lambda r, c: (n - r, c),
+        lambda r, c: (c, r),
+        lambda r, c: (n - c, n - r),
+    ]
+    maps = []
+    for t in transforms:
+        maps.append(tuple(
+            t(r, c)[0] * size + t(r, c)[1] for r in range(size) for c in range(size)
+        ))
+    return tuple(maps)
+
+
+# _symmetries 中每种变换的逆变换下标
+_INVERSE = (0, 3, 2, 1, 4, 5, 6, 7)
+
+
+def canonical_key(board, player):
+    """在 8 种对称变换中取 Zobrist 键最小者，返回 (键, 变换下标)"""
+    zobrist = _zobrist(board.size)
+    stones = []
+    for p in (HUMAN, AI):
+        bits = board.bits[p][0]
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            r, c = divmod(low.bit_length() - 1, board.stride)
+            stones.append((r * board.size + c, p))
+
+    side = SIDE_KEY if player == HUMAN else 0
+    best = None
+    for t, mapping in enumerate(_symmetries(board.size)):
+        key = side
+        for cell, p in stones:
+            key ^= zobrist[mapping[cell]][p]
+        if best is None or key < best[0]:
+            best = (key, t)
+    return best
+
+
+class OpeningBook:
+    """用 mmap 读取的开局库，按键二分查找，不把整个文件读进内存"""
+
+    def __init__(self, path=BOOK_PATH):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, rule, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} 不是有效的开局库文件")
+        self.rule = RULES[rule]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _find(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            k, r, c = RECORD.unpack_from(self._map, HEADER.size + mid * RECORD.size)
+            if k < key:
+                lo = mid + 1
+            elif k > key:
+                hi = mid
+            else:
+                return r, c
+        return None
+
+    def lookup(self, board, player):
+        """查当前局面的库内落子，查不到或棋盘/规则不符时返回 None"""
+        if self._map is None or (board.size, board.rule) != (self.size, self.rule):
+            return None
+        key, t = canonical_key(board, player)
+        found = self._find(key)
+        if found is None:
+            return None
+        cell = _symmetries(board.size)[_INVERSE[t]][found[0] * board.size + found[1]]
+        move = divmod(cell, board.size)
+        if board.get(*move) or (player == HUMAN and board.is_forbidden(*move)):
+            return None
+        return move
+
+
+def write_book(path, size, rule, entries):
+    """entries 为 {规范化键: 规范朝向下的 (行, 列)}，按键排序后写入文件"""
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, RULES.index(rule), len(entries)))
+        for key in sorted(entries):
+            r, c = entries[key]
+            f.write(RECORD.pack(key, r, c))
+
+
+def build_book(engine, size=BOARD_SIZE, rule=FREESTYLE, plies=4, width=3, log=print):
+    """从空棋盘出发逐层展开：每个局面记下引擎的落子，再以启发式前 width 手作为后续局面
+
+    对称或换序得到的相同局面只搜索一次。返回 {规范化键: 规范朝向下的落子}。
+    """
+    entries = {}
+    frontier = [(Bitboard(size, rule), HUMAN)]
+    for ply in range(plies + 1):
+        start = time.perf_counter()
+        next_frontier = []
+        for board, player in frontier:
+            key, t = canonical_key(board, player)
+            if key in entries:
+                continue
+            move = engine.move(board, player)
+            if move is None:
+                continue
+            cell = _symmetries(size)[t][move[0] * size + move[1]]
+            entries[key] = divmod(cell, size)
+            if ply == plies:
+                continue
+            replies = order_moves(board, player, width) or [move]
+            if move not in replies:
+                replies[-1] = move
+            for r, c in replies:
+                child = board.copy()
+                child.place(r, c, player)
+                if not child.is_win(r, c):
+                    next_frontier.append((child, AI if player == HUMAN else HUMAN))
+        log(f"第 {ply} 手：{len(frontier)} 个局面，累计 {len(entries)} 条，"
+            f"用时 {time.perf_counter() - start:.1f} 秒")
+        frontier = next_frontier
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线生成五子棋开局库")
+    parser.add_argument("-o", "--output", default=BOOK_PATH)
+    parser.add_argument("--plies", type=int, default=4, help="展开到第几手")
+    parser.add_argument("--width", type=int, default=3, help="每个局面展开的后续着法数")
+    parser.add_argument("--depth", type=int, default=6, help="生成时的搜索深度")
+    parser.add_argument("--time", type=float, default=None, help="每步限时（秒），给出时改为迭代加深")
+    parser.add_argument("--size", type=int, default=BOARD_SIZE)
+    parser.add_argument("--rule", choices=RULES, default=FREESTYLE)
+    args = parser.parse_args(argv)
+
+    engine = Engine(args.depth, args.time)
+    try:
+        entries = build_book(engine, args.size, args.rule, args.plies, args.width)
+    finally:
+        engine.close()
+    write_book(args.output, args.size, args.rule, entries)
+    print(f"已写入 {args.output}：{len(entries)} 条")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1056 @@
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 可选，没有时只走纯 Python 路径
+    np = None
+
+BOARD_SIZE = 15
+
+# 规则：无禁手（五连及以上都算赢）、标准（恰好五连才算赢）、连珠（黑棋恰好五连才赢，且有长连/双四/双三禁手）
+FREESTYLE = "freestyle"
+STANDARD = "standard"
+RENJU = "renju"
+RULES = (FREESTYLE, STANDARD, RENJU)
+
+HUMAN = 1   # 黑棋
+AI = 2      # 白棋
+
+# 棋型评分表
+SCORE = {
+    (5, True):  1_000_000,   # 五连
+    (4, True):    50_000,    # 活四
+    (4, False):   10_000,    # 冲四
+    (3, True):     2_000,    # 活三
+    (3, False):      500,    # 眠三
+    (2, True):       100,    # 活二
+    (2, False):       20,    # 眠二
+}
+FIVE = SCORE[(5, True)]
+FOUR = SCORE[(4, False)]
+OPEN_THREE = SCORE[(3, True)]
+
+SEARCH_DEPTH = 4        # 搜索深度（层），0 表示只做一层启发式评分
+MOVE_TIME = 1.0         # 界面中 AI 每步的思考时间（秒）：调大更强，调小更快
+MAX_SEARCH_DEPTH = 12   # 限时迭代加深的深度上限
+MAX_CANDIDATES = 12     # 每层只展开启发式评分最高的若干候选点
+TT_SIZE = 1 << 18       # 置换表槽位数（2 的幂）
+WIN_SCORE = 10_000_000  # 必胜分，减去步数以偏好更快的胜利
+INF = float("inf")
+THREAT_NODES = 1500     # 算杀（VCF/VCT）每步的节点预算
+VCF_DEPTH = 10          # 连续冲四最多走几手
+VCT_DEPTH = 4           # 连续活三/冲四最多走几手
+PARALLEL_WORKERS = 0    # 根节点并行搜索的进程数，0 表示单进程
+VECTORIZED = False      # 一层评分和根节点排序是否用 NumPy 批量计算（需要安装 numpy）
+PONDER_REPLIES = 4      # 后台预判时对对手最可能的几步应对预先搜索
+
+
+# 四个方向：横、竖、主对角线、副对角线
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+DIR_INDEX = {d: i for i, d in enumerate(DIRECTIONS)}
+
+
+@lru_cache(maxsize=None)
+def _layout(size):
+    """预计算四种排布下每个格子的 (位号, 线起始位, 线内位置, 线长)
+
+    每条线占 size + 1 位，多出的一位是哨兵，保证移位不会串到相邻的线上。
+    """
+    stride = size + 1
+    layout = []
+    for dr, dc in DIRECTIONS:
+        cells = []
+        for r in range(size):
+            for c in range(size):
+                if (dr, dc) == (0, 1):
+                    line, pos, length = r, c, size
+                elif (dr, dc) == (1, 0):
+                    line, pos, length = c, r, size
+                elif (dr, dc) == (1, 1):
+                    line, pos, length = c - r + size - 1, min(r, c), size - abs(c - r)
+                else:
+                    line, pos, length = r + c, min(r, size - 1 - c), size - abs(r + c - size + 1)
+                base = line * stride
+                cells.append((base + pos, base, pos, length))
+        layout.append(tuple(cells))
+    return tuple(layout)
+
+
+@lru_cache(maxsize=None)
+def _neighbors(size):
+    """neighbors[cell]：cell 周围八个方向上相邻的格子"""
+    return tuple(
+        tuple((r + dr) * size + c + dc
+              for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+              if (dr, dc) != (0, 0) and 0 <= r + dr < size and 0 <= c + dc < size)
+        for r in range(size) for c in range(size)
+    )
+
+
+@lru_cache(maxsize=None)
+def _zobrist(size):
+    """每个格子每方一个 64 位随机数，固定种子保证不同进程得到相同的键"""
+    rng = random.Random(size)
+    return tuple((0, rng.getrandbits(64), rng.getrandbits(64)) for _ in range(size * size))
+
+
+# 轮到 HUMAN 走时异或进键里，区分同一局面下不同的行棋方
+SIDE_KEY = 0x9E3779B97F4A7C15
+
+
+# 棋型查表窗口为中心格左右各 REACH 格，一颗棋子也只影响这个范围内格子的分数
+REACH = 4
+WINDOW = 2 * REACH + 1
+
+
+@lru_cache(maxsize=None)
+def _reach(size):
+    """reach[d][cell]：第 d 个方向上与 cell 相距不超过 REACH 的格子（含自身）"""
+    reach = []
+    for dr, dc in DIRECTIONS:
+        cells = []
+        for r in range(size):
+            for c in range(size):
+                cells.append(tuple(
+                    (r + k * dr) * size + c + k * dc
+                    for k in range(-REACH, REACH + 1)
+                    if 0 <= r + k * dr < size and 0 <= c + k * dc < size
+                ))
+        reach.append(tuple(cells))
+    return tuple(reach)
+
+
+def _run(own, pos):
+    """返回 own 中包含 pos 位的连续段的 (起点, 终点)"""
+    own |= 1 << pos
+    high = own >> pos
+    end = pos + (high ^ (high + 1)).bit_length() - 2
+    below = (1 << pos) - 1
+    start = ((~own) & below).bit_length()
+    return start, end
+
+
+class Bitboard:
+    """位棋盘：每方在横、竖、两条对角线四种排布下各用一个整数位掩码表示
+
+    边长和规则都是每局的参数；frontier 是与棋子相邻的空位集合，随落子增量维护。
+    """
+
+    def __init__(self, size=BOARD_SIZE, rule=FREESTYLE):
+        if rule not in RULES:
+            raise ValueError(f"未知规则 {rule!r}")
+        self.size = size
+        self.rule = rule
+        self.stride = size + 1
+        self.count = 0
+        self.hash = 0
+        self.frontier = set()
+        self._near = [0] * (size * size)  # 每格周围的棋子数
+        self._neighbors = _neighbors(size)
+        self._cells = _layout(size)
+        self._zobrist = _zobrist(size)
+        self._line_mask = (1 << self.stride) - 1
+        # bits[player][d]，player 为 HUMAN/AI，下标 0 不用
+        self.bits = [None, [0, 0, 0, 0], [0, 0, 0, 0]]
+        self.patterns = PatternCache(self)
+
+    def copy(self):
+        other = Bitboard.__new__(Bitboard)
+        other.__dict__.update(self.__dict__)
+        other.bits = [None, self.bits[HUMAN][:], self.bits[AI][:]]
+        other.frontier = set(self.frontier)
+        other._near = self._near[:]
+        other.patterns = self.patterns.copy(other)
+        return other
+
+    def to_bytes(self):
+        """紧凑序列化：1 字节边长 + 1 字节规则 + 双方横向排布位掩码，用于发给子进程"""
+        n = (self.size * self.stride + 7) // 8
+        return bytes([self.size, RULES.index(self.rule)]) \
+            + self.bits[HUMAN][0].to_bytes(n, "little") + self.bits[AI][0].to_bytes(n, "little")
+
+    @classmethod
+    def from_bytes(cls, data):
+        board = cls(data[0], RULES[data[1]])
+        n = (board.size * board.stride + 7) // 8
+        for player, chunk in ((HUMAN, data[2:2 + n]), (AI, data[2 + n:2 + 2 * n])):
+            stones = int.from_bytes(chunk, "little")
+            while stones:
+                low = stones & -stones
+                stones ^= low
+                board.place(*divmod(low.bit_length() - 1, board.stride), player)
+        return board
+
+    def get(self, row, col):
+        bit = 1 << (row * self.stride + col)
+        if self.bits[HUMAN][0] & bit:
+            return HUMAN
+        if self.bits[AI][0] & bit:
+            return AI
+        return 0
+
+    def place(self, row, col, player):
+        own = self.bits[player]
+        cell = row * self.size + col
+        for d in range(4):
+            own[d] |= 1 << self._cells[d][cell][0]
+        self.count += 1
+        self.hash ^= self._zobrist[cell][player]
+        self.frontier.discard(cell)
+        for x in self._neighbors[cell]:
+            self._near[x] += 1
+            if not self._occupied(x):
+                self.frontier.add(x)
+        self.patterns.place(cell)
+
+    def remove(self, row, col):
+        player = self.get(row, col)
+        own = self.bits[player]
+        cell = row * self.size + col
+        for d in range(4):
+            own[d] &= ~(1 << self._cells[d][cell][0])
+        self.count -= 1
+        self.hash ^= self._zobrist[cell][player]
+        for x in self._neighbors[cell]:
+            self._near[x] -= 1
+            if not self._near[x]:
+                self.frontier.discard(x)
+        if self._near[cell]:
+            self.frontier.add(cell)
+        self.patterns.remove(cell)
+
+    def _occupied(self, cell):
+        r, c = divmod(cell, self.size)
+        return (self.bits[HUMAN][0] | self.bits[AI][0]) >> (r * self.stride + c) & 1
+
+    def is_empty(self):
+        return self.count == 0
+
+    def is_full(self):
+        return self.count == self.size * self.size
+
+    def line(self, player, row, col, d):
+        """取出 (row,col) 所在第 d 个方向的整条线：(己方位, 对方位, 线内位置, 线长)"""
+        _, base, pos, length = self._cells[d][row * self.size + col]
+        own = (self.bits[player][d] >> base) & self._line_mask
+        opp = (self.bits[3 - player][d] >> base) & self._line_mask
+        return own, opp, pos, length
+
+    def key(self, player):
+        """轮到 player 行棋时的局面键"""
+        return self.hash ^ SIDE_KEY if player == HUMAN else self.hash
+
+    def _is_five(self, count, player):
+        """按当前规则，count 连子是否算赢"""
+        if self.rule == STANDARD or (self.rule == RENJU and player == HUMAN):
+            return count == 5
+        return count >= 5
+
+    def _runs(self, player, row, col):
+        """player 落在 (row,col) 后四个方向上经过该点的连子 (起点, 终点, 线内位置)"""
+        runs = []
+        for d in range(4):
+            own, _, pos, _ = self.line(player, row, col, d)
+            runs.append(_run(own, pos) + (pos,))
+        return runs
+
+    def makes_five(self, row, col, player):
+        """player 落在 (row,col)（可以是已落下的子）是否按规则成五"""
+        return any(self._is_five(end - start + 1, player)
+                   for start, end, _ in self._runs(player, row, col))
+
+    def is_win(self, row, col):
+        """(row,col) 处的棋子是否构成五连"""
+        return self.makes_five(row, col, self.get(row, col))
+
+    def winning_line(self, row, col):
+        """若 (row,col) 处的棋子构成五连，返回该连线上的所有格子，否则返回 None"""
+        player = self.get(row, col)
+        for (dr, dc), (start, end, pos) in zip(DIRECTIONS, self._runs(player, row, col)):
+            if self._is_five(end - start + 1, player):
+                return [(row + (p - pos) * dr, col + (p - pos) * dc)
+                        for p in range(start, end + 1)]
+        return None
+
+    def is_forbidden(self, row, col):
+        """连珠规则下黑棋（HUMAN）落在空位 (row,col) 是否为禁手
+
+        成五优先；否则长连、双四、双三为禁手。四和活三按棋型表判断，不再递归检查成四点本身是否禁手。
+        """
+        if self.rule != RENJU:
+            return False
+        counts = [end - start + 1 for start, end, _ in self._runs(HUMAN, row, col)]
+        if 5 in counts:
+            return False
+        if max(counts) > 5:
+            return True
+        cell = row * self.size + col
+        scores = [self.patterns.scores[HUMAN][d][cell] for d in range(4)]
+        fours = sum(FOUR <= s < FIVE for s in scores)
+        threes = sum(s == OPEN_THREE for s in scores)
+        return fours >= 2 or threes >= 2
+
+    def candidates(self):
+        """按行优先顺序返回所有有邻居的空位（取自增量维护的 frontier）"""
+        size = self.size
+        return [divmod(cell, size) for cell in sorted(self.frontier)]
+
+
+_CENTER = 1 << REACH
+_WINDOW_MASK = (1 << WINDOW) - 1
+# 窗口内所有经过中心格的五连
+_FIVES = tuple(0b11111 << s for s in range(WINDOW - 4) if (0b11111 << s) & _CENTER)
+
+
+def _build_patterns():
+    """生成 9 格窗口到棋型分数的查找表
+
+    下标为 (己方位 << WINDOW) | 对方位，中心格是己方刚落的子，棋盘外按对方棋子处理。
+    有两个以上空位能一步成五为活四，只有一个为冲四；再走一步能成活四/冲四的为活三/眠三，
+    能成活三/眠三的为活二/眠二。所以 X_XX、XX_XX 这类跳子棋型也能识别。
+    """
+    memo = {}
+
+    def shape(own, opp):
+        key = (own, opp)
+        if key in memo:
+            return memo[key]
+        if any(own & five == five for five in _FIVES):
+            result = (5, True)
+        else:
+            empties = [1 << i for i in range(WINDOW) if not ((own | opp) >> i) & 1]
+            wins = sum(1 for e in empties if any((own | e) & five == five for five in _FIVES))
+            if wins:
+                result = (4, wins >= 2)
+            else:
+                result = None
+                after = {shape(own | e, opp) for e in empties}
+                for n in (4, 3):
+                    if (n, True) in after:
+                        result = (n - 1, True)
+                        break
+                    if (n, False) in after:
+                        result = (n - 1, False)
+                        break
+        memo[key] = result
+        return result
+
+    table = [0] * (1 << (2 * WINDOW))
+    for opp in range(1 << WINDOW):
+        if opp & _CENTER:
+            continue
+        free = _WINDOW_MASK & ~opp & ~_CENTER
+        own = free
+        while True:  # 枚举 free 的所有子集
+            table[(own | _CENTER) << WINDOW | opp] = SCORE.get(shape(own | _CENTER, opp), 0)
+            if not own:
+                break
+            own = (own - 1) & free
+    return table
+
+
+_PATTERNS = _build_patterns()
+
+
+def _shape_score(own, opp, pos, length):
+    """一条线上以 pos 为中心、pos 视为己方落子的 9 格窗口的棋型分数"""
+    opp |= ~((1 << length) - 1)  # 棋盘外视为对方棋子
+    low = pos - REACH
+    if low >= 0:
+        own >>= low
+        opp >>= low
+    else:
+        own <<= -low
+        opp = (opp << -low) | ((1 << -low) - 1)
+    return _PATTERNS[((own & _WINDOW_MASK) | _CENTER) << WINDOW | (opp & _WINDOW_MASK)]
+
+
+def evaluate_line(board, player, row, col, dr, dc):
+    """评估 player 落在 (row,col) 后某方向上的棋型分数"""
+    return _shape_score(*board.line(player, row, col, DIR_INDEX[(dr, dc)]))
+
+
+class PatternCache:
+    """逐格、逐方向缓存双方的棋型分数，落子或悔棋时只更新受影响的格子
+
+    空位上是“假如该方落在这里”的分数，己方棋子上是它所在连子的分数，对方棋子上为 0。
+    每次落子把改动前的值压栈，撤销最近一步时直接弹栈还原。
+    threats[player] 是该方落下后某一方向能成活三及以上的空位，供算杀直接取用。
+    """
+
+    def __init__(self, board):
+        self.board = board
+        n = board.size * board.size
+        self._reach = _reach(board.size)
+        # scores[player][d][cell] 与 totals[player][cell]（四个方向之和）
+        self.scores = [None, [[0] * n for _ in range(4)], [[0] * n for _ in range(4)]]
+        self.totals = [None, [0] * n, [0] * n]
+        self.threats = [None, set(), set()]
+        self._undo = []
+        for cell in range(n):
+            for p in (HUMAN, AI):
+                for d in range(4):
+                    s = self._compute(p, d, cell)
+                    self.scores[p][d][cell] = s
+                    self.totals[p][cell] += s
+                self._mark(p, cell)
+
+    def copy(self, board):
+        other = PatternCache.__new__(PatternCache)
+        other.board = board
+        other._reach = self._reach
+        other.scores = [None] + [[s[:] for s in self.scores[p]] for p in (HUMAN, AI)]
+        other.totals = [None, self.totals[HUMAN][:], self.totals[AI][:]]
+        other.threats = [None, set(self.threats[HUMAN]), set(self.threats[AI])]
+        other._undo = []
+        return other
+
+    def _compute(self, player, d, cell):
+        board = self.board
+        off, base, pos, length = board._cells[d][cell]
+        if (board.bits[3 - player][d] >> off) & 1:
+            return 0
+        own = (board.bits[player][d] >> base) & board._line_mask
+        opp = (board.bits[3 - player][d] >> base) & board._line_mask
+        return _shape_score(own, opp, pos, length)
+
+    def _mark(self, player, cell):
+        s = self.scores[player]
+        r, c = divmod(cell, self.board.size)
+        if not self.board.get(r, c) and \
+                max(s[0][cell], s[1][cell], s[2][cell], s[3][cell]) >= OPEN_THREE:
+            self.threats[player].add(cell)
+        else:
+            self.threats[player].discard(cell)
+
+    def _mark_changes(self, cell, changes):
+        """changes 为 [(player, 格子, 改动前的值, 改动后的值)]，只有跨过活三分数线的才可能影响 threats"""
+        marks = {(HUMAN, cell), (AI, cell)}
+        marks.update((p, x) for p, x, a, b in changes if a >= OPEN_THREE or b >= OPEN_THREE)
+        for p, x in marks:
+            self._mark(p, x)
+
+    def _refresh(self, cell):
+        """重算经过 cell 的四条线上受影响的格子，返回 [(player, d, 格子, 旧值)]"""
+        board = self.board
+        mask = board._line_mask
+        changes = []
+        for d in range(4):
+            cells = board._cells[d]
+            _, base, _, length = cells[cell]
+            line = (None, (board.bits[HUMAN][d] >> base) & mask, (board.bits[AI][d] >> base) & mask)
+            for p in (HUMAN, AI):
+                own, opp = line[p], line[3 - p]
+                scores, totals = self.scores[p][d], self.totals[p]
+                for x in self._reach[d][cell]:
+                    pos = cells[x][2]
+                    new = 0 if (opp >> pos) & 1 else _shape_score(own, opp, pos, length)
+                    old = scores[x]
+                    if new != old:
+                        changes.append((p, d, x, old))
+                        scores[x] = new
+                        totals[x] += new - old
+        return changes
+
+    def place(self, cell):
+        changes = self._refresh(cell)
+        self._mark_changes(cell, [(p, x, old, self.scores[p][d][x]) for p, d, x, old in changes])
+        self._undo.append((cell, changes))
+
+    def remove(self, cell):
+        if self._undo and self._undo[-1][0] == cell:
+            marks = []
+            for p, d, x, old in reversed(self._undo.pop()[1]):
+                new = self.scores[p][d][x]
+                self.totals[p][x] += old - new
+                self.scores[p][d][x] = old
+                marks.append((p, x, new, old))
+        else:
+            # 不是撤销最近一步：就地重算，之前的撤销记录随之失效
+            changes = self._refresh(cell)
+            marks = [(p, x, old, self.scores[p][d][x]) for p, d, x, old in changes]
+            self._undo.clear()
+        self._mark_changes(cell, marks)
+
+
+def score_position(board, row, col, player):
+    """某位置落子后的综合分数（四个方向之和，取自增量缓存）"""
+    return board.patterns.totals[player][row * board.size + col]
+
+
+def evaluate_board(board, player):
+    """静态评估：双方每颗棋子所在棋型分数之和的差（从 player 视角）"""
+    total = 0
+    for p, sign in ((player, 1), (3 - player, -1)):
+        totals = board.patterns.totals[p]
+        stones = board.bits[p][0]
+        while stones:
+            low = stones & -stones
+            stones ^= low
+            r, c = divmod(low.bit_length() - 1, board.stride)
+            total += sign * totals[r * board.size + c]
+    return total
+
+
+@lru_cache(maxsize=None)
+def _patterns_array():
+    return np.array(_PATTERNS, dtype=np.int64)
+
+
+def _grid(board):
+    """棋盘转成 size x size 的 int8 数组，0 空、1 HUMAN、2 AI"""
+    n, stride = board.size, board.stride
+    nbytes = (n * stride + 7) // 8
+    grid = np.zeros(n * stride, dtype=np.int8)
+    for p in (HUMAN, AI):
+        raw = np.frombuffer(board.bits[p][0].to_bytes(nbytes, "little"), dtype=np.uint8)
+        grid += np.unpackbits(raw, bitorder="little")[:n * stride].astype(np.int8) * p
+    return grid.reshape(n, stride)[:, :n]
+
+
+def batch_scores(board, player):
+    """用 NumPy 一次算出所有候选点的启发式评分
+
+    返回 (行优先的候选点列表, 对应评分数组)，评分与 order_moves 的纯 Python 路径逐位相同。
+    """
+    n = board.size
+    grid = _grid(board)
+
+    # 邻居掩码：占用格在 3x3 范围内平移求和，相当于和全 1 卷积核做卷积
+    occupied = np.zeros((n + 2, n + 2), dtype=np.int8)
+    occupied[1:-1, 1:-1] = grid != 0
+    neighbors = sum(occupied[1 + dr:1 + dr + n, 1 + dc:1 + dc + n]
+                    for dr in (-1, 0, 1) for dc in (-1, 0, 1) if (dr, dc) != (0, 0))
+    mask = (neighbors > 0) & (grid == 0)
+
+    # 四周垫 REACH 圈“墙”（按对方棋子处理），每个方向把 9 格窗口编码成查表下标
+    padded = np.full((n + 2 * REACH, n + 2 * REACH), 3, dtype=np.int8)
+    padded[REACH:REACH + n, REACH:REACH + n] = grid
+    table = _patterns_array()
+    totals = {HUMAN: np.zeros((n, n), dtype=np.int64), AI: np.zeros((n, n), dtype=np.int64)}
+    for dr, dc in DIRECTIONS:
+        codes = {v: np.zeros((n, n), dtype=np.int64) for v in (HUMAN, AI, 3)}
+        for k in range(-REACH, REACH + 1):
+            window = padded[REACH + k * dr:REACH + k * dr + n, REACH + k * dc:REACH + k * dc + n]
+            for v, code in codes.items():
+                code |= (window == v).astype(np.int64) << (k + REACH)
+        for p in (HUMAN, AI):
+            own, opp = codes[p], codes[3 - p] | codes[3]
+            totals[p] += table[((own | _CENTER) << WINDOW) | opp]
+
+    rows, cols = np.nonzero(mask)
+    scores = totals[player][rows, cols] * 1.1 + totals[3 - player][rows, cols]
+    return list(zip(rows.tolist(), cols.tolist())), scores
+
+
+def order_moves(board, player, width=None, first=None, vectorized=False):
+    """按启发式评分给候选点排序（进攻权重略高于防守），first 排在最前
+
+    vectorized 为 True 且装有 NumPy 时用 batch_scores 批量评分，结果相同。
+    """
+    if vectorized and np is not None:
+        candidates, scores = batch_scores(board, player)
+        # 稳定排序，同分时保持行优先顺序
+        moves = [candidates[i] for i in np.argsort(-scores, kind="stable").tolist()]
+    else:
+        scored = []
+        for r, c in board.candidates():
+            s = score_position(board, r, c, player) * 1.1 + score_position(board, r, c, 3 - player)
+            scored.append((s, (r, c)))
+        scored.sort(key=lambda t: -t[0])
+        moves = [pos for _, pos in scored]
+    if board.rule == RENJU and player == HUMAN:
+        moves = [m for m in moves if not board.is_forbidden(*m)]
+    if first in moves:
+        moves.remove(first)
+        moves.insert(0, first)
+    return moves[:width] if width else moves
+
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    """以 Zobrist 键索引的定长置换表
+
+    替换策略：空槽、同一局面、上一次搜索留下的旧条目，或深度不低于旧条目时覆盖。
+    """
+
+    def __init__(self, size=TT_SIZE):
+        self.mask = size - 1
+        self.entries = [None] * size
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * (self.mask + 1)
+
+    def get(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, key, depth, score, flag, move):
+        slot = key & self.mask
+        old = self.entries[slot]
+        if old is None or old[0] == key or old[5] != self.generation or depth >= old[1]:
+            self.entries[slot] = (key, depth, score, flag, move, self.generation)
+
+
+def _to_tt(score, ply):
+    """胜负分转成相对当前节点的值再入表，取出时再换回"""
+    if score > WIN_SCORE // 2:
+        return score + ply
+    if score < -WIN_SCORE // 2:
+        return score - ply
+    return score
+
+
+def _from_tt(score, ply):
+    if score > WIN_SCORE // 2:
+        return score - ply
+    if score < -WIN_SCORE // 2:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    """搜索超时或被取消"""
+
+
+class Searcher:
+    """带 alpha-beta 剪枝和置换表的 negamax 搜索"""
+
+    def __init__(self, depth=SEARCH_DEPTH, width=MAX_CANDIDATES, tt=None, stop=None):
+        self.depth = depth
+        self.width = width
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.stop = stop        # threading.Event，置位即取消搜索
+        self.deadline = None    # time.perf_counter() 截止时刻
+        self.nodes = 0
+        self.depth_reached = 0
+        self.best_move = None
+
+    def search(self, board, player):
+        """固定深度搜索，返回 (最佳落子, 分数)"""
+        self.nodes = 0
+        result = self._search_root(board, player, self.depth)
+        self.depth_reached = self.depth
+        return result
+
+    def iterate(self, board, player, time_limit=None):
+        """迭代加深到 self.depth，超时或取消时返回已完成的最深一层的 (最佳落子, 分数)"""
+        # 中途超时会留下未撤销的落子，所以在副本上搜索
+        board = board.copy()
+        self.nodes = 0
+        self.depth_reached = 0
+        if time_limit is not None:
+            self.deadline = time.perf_counter() + time_limit
+        result = (None, 0)
+        for depth in range(1, self.depth + 1):
+            try:
+                result = self._search_root(board, player, depth)
+            except SearchTimeout:
+                break
+            self.depth_reached = depth
+            if abs(result[1]) > WIN_SCORE // 2:
+                break  # 胜负已定，不必再加深
+        return result
+
+    def _search_root(self, board, player, depth):
+        self.best_move = None
+        self.tt.new_search()
+        score = self._negamax(board, player, depth, -INF, INF, 0)
+        return self.best_move, score
+
+    def _expired(self):
+        if self.stop is not None and self.stop.is_set():
+            return True
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def _negamax(self, board, player, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 63 == 0 and self._expired():
+            raise SearchTimeout
+        key = board.key(player)
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                score, flag = _from_tt(entry[2], ply), entry[3]
+                if flag == EXACT:
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        if depth <= 0:
+            return evaluate_board(board, player)
+
+        moves = order_moves(board, player, self.width, tt_move)
+        if not moves:
+            return 0  # 棋盘已满，和棋
+
+        alpha_orig = alpha
+        best, best_move = -INF, None
+        for r, c in moves:
+            board.place(r, c, player)
+            if board.is_win(r, c):
+                score = WIN_SCORE - ply - 1
+            else:
+                score = -self._negamax(board, 3 - player, depth - 1, -beta, -alpha, ply + 1)
+            board.remove(r, c)
+            if score > best:
+                best, best_move = score, (r, c)
+                if ply == 0:
+                    self.best_move = best_move
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.put(key, depth, _to_tt(best, ply), flag, best_move)
+        return best
+
+
+# 子进程共享的根节点 alpha（multiprocessing.Value），由进程池初始化时传入
+_shared_alpha = None
+
+
+def _init_worker(alpha):
+    global _shared_alpha
+    _shared_alpha = alpha
+
+
+def _search_root_moves(data, player, depth, width, moves):
+    """子进程：依次搜索分到的根节点着法，返回 ([(分数, 是否精确)], 节点数)"""
+    board = Bitboard.from_bytes(data)
+    searcher = Searcher(depth, width)
+    searcher.tt.new_search()
+    results = []
+    for r, c in moves:
+        # 减 1 让与当前最好值同分的着法也能得到精确分，合并结果时才与分配方式无关
+        alpha = _shared_alpha.value - 1
+        board.place(r, c, player)
+        if board.is_win(r, c):
+            score = WIN_SCORE - 1
+        else:
+            score = -searcher._negamax(board, 3 - player, depth - 1, -INF, -alpha, 1)
+        board.remove(r, c)
+        exact = score > alpha
+        if exact:
+            with _shared_alpha.get_lock():
+                if score > _shared_alpha.value:
+                    _shared_alpha.value = score
+        results.append((score, exact))
+    return results, searcher.nodes
+
+
+class SearchPool:
+    """根节点并行搜索用的常驻进程池：子进程只在第一次搜索时启动（并建好棋型表），之后每步复用"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.alpha = multiprocessing.Value("d", -INF)
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                         initargs=(self.alpha,))
+
+    def map_chunks(self, data, player, depth, width, chunks):
+        """各块着法交给子进程搜索，按块的顺序返回结果；每次搜索前重置共享的 alpha"""
+        self.alpha.value = -INF
+        futures = [self._pool.submit(_search_root_moves, data, player, depth, width, chunk)
+                   for chunk in chunks]
+        return [f.result() for f in futures]
+
+    def close(self):
+        self._pool.shutdown()
+
+
+def parallel_search(board, player, depth=SEARCH_DEPTH, workers=None, width=MAX_CANDIDATES,
+                    vectorized=VECTORIZED, pool=None):
+    """根节点并行搜索，返回 (最佳落子, 分数, 节点数)
+
+    排好序的根着法轮流分给各进程，各进程通过共享的 alpha 互相剪枝；
+    合并时取精确分最高者，同分取排序靠前者，结果与进程调度先后无关。
+    pool 为 None 时临时建一个进程池，用完关闭；连续搜索应传入常驻的 SearchPool。
+    """
+    moves = order_moves(board, player, width, vectorized=vectorized)
+    if not moves:
+        return None, 0, 0
+    own = pool is None
+    if own:
+        pool = SearchPool(min(workers or os.cpu_count() or 1, len(moves)))
+    workers = min(pool.workers, len(moves))
+    chunks = [moves[i::workers] for i in range(workers)]
+    try:
+        outputs = pool.map_chunks(board.to_bytes(), player, depth, width, chunks)
+    finally:
+        if own:
+            pool.close()
+
+    best = None
+    nodes = 0
+    for chunk, (results, n) in zip(chunks, outputs):
+        nodes += n
+        for move, (score, exact) in zip(chunk, results):
+            if exact:
+                candidate = (score, -moves.index(move), move)
+                if best is None or candidate > best:
+                    best = candidate
+    return best[2], best[0], nodes
+
+
+def threat_moves(board, player, threshold):
+    """player 落下后某一方向棋型分数不低于 threshold 的空位，按总分从高到低排列"""
+    scores = board.patterns.scores[player]
+    totals = board.patterns.totals[player]
+    moves = []
+    for cell in board.patterns.threats[player]:
+        if max(scores[0][cell], scores[1][cell], scores[2][cell], scores[3][cell]) >= threshold:
+            moves.append((-totals[cell], divmod(cell, board.size)))
+    moves.sort()
+    moves = [pos for _, pos in moves]
+    if board.rule != FREESTYLE:
+        # 棋型表把长连也算作五，这里按规则复核，并去掉黑棋的禁手
+        if threshold >= FIVE:
+            moves = [m for m in moves if board.makes_five(m[0], m[1], player)]
+        elif board.rule == RENJU and player == HUMAN:
+            moves = [m for m in moves if board.makes_five(m[0], m[1], player)
+                     or not board.is_forbidden(*m)]
+    return moves
+
+
+class ThreatSolver:
+    """算杀：只展开冲四（VCF）或冲四加活三（VCT）的进攻，证明出的结果跨调用缓存"""
+
+    def __init__(self, node_limit=THREAT_NODES):
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.stop = None
+        self.deadline = None  # time.perf_counter() 截止时刻
+        # (局面键, 是否 VCT) -> (已证明的深度, 必胜着法或 None)
+        self.cache = {}
+
+    def solve(self, board, player, stop=None, deadline=None):
+        """依次尝试 VCF、VCT，在节点预算和截止时刻内找到必胜的第一步则返回，否则返回 None"""
+        self.nodes = 0
+        self.stop = stop
+        self.deadline = deadline
+        # 预算耗尽时会留下未撤销的落子，所以在副本上求解
+        board = board.copy()
+        try:
+            for vct, depth in ((False, VCF_DEPTH), (True, VCT_DEPTH)):
+                move = self._attack(board, player, depth, vct)
+                if move is not None:
+                    return move
+        except SearchTimeout:
+            pass
+        return None
+
+    def _attack(self, board, player, depth, vct):
+        """进攻方 player 行棋，返回能证明必胜的一步，证明不了则返回 None"""
+        self.nodes += 1
+        if self.nodes > self.node_limit or self._expired():
+            raise SearchTimeout
+
+        fives = threat_moves(board, player, FIVE)
+        if fives:
+            return fives[0]
+        if depth <= 0:
+            return None
+
+        key = (board.key(player), vct)
+        cached = self.cache.get(key)
+        if cached is not None and (cached[1] is not None or cached[0] >= depth):
+            return cached[1]
+
+        blocks = threat_moves(board, 3 - player, FIVE)
+        if len(blocks) >= 2:
+            result = None  # 对方有两处成五，挡不住
+        else:
+            moves = threat_moves(board, player, OPEN_THREE if vct and not blocks else FOUR)
+            if blocks:
+                # 对方已经冲四：只有既挡住又形成冲四的一手还能继续
+                moves = [m for m in moves if m == blocks[0]]
+            result = None
+            for r, c in moves:
+                board.place(r, c, player)
+                won = self._defend(board, 3 - player, player, depth, vct)
+                board.remove(r, c)
+                if won:
+                    result = (r, c)
+                    break
+
+        self.cache[key] = (depth, result)
+        return result
+
+    def _expired(self):
+        if self.stop is not None and self.stop.is_set():
+            return True
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def _defend(self, board, player, attacker, depth, vct):
+        """防守方 player 行棋，所有防守都失败时返回 True"""
+        if self._expired():
+            raise SearchTimeout
+        if threat_moves(board, player, FIVE):
+            return False
+        fives = threat_moves(board, attacker, FIVE)
+        if len(fives) >= 2:
+            return True
+        if fives:
+            defences = fives
+        else:
+            # 对方走出活三：挡在能成四的点上，或者自己冲四反击
+            defences = threat_moves(board, attacker, FOUR)
+            defences += [m for m in threat_moves(board, player, FOUR) if m not in defences]
+            if not defences:
+                return False
+        for r, c in defences:
+            board.place(r, c, player)
+            won = self._attack(board, attacker, depth - 1, vct) is not None
+            board.remove(r, c)
+            if not won:
+                return False
+        return True
+
+
+class Engine:
+    """一组搜索参数加上跨步复用的置换表和算杀缓存，last 记录上一步的统计"""
+
+    def __init__(self, depth=SEARCH_DEPTH, time_limit=None, width=MAX_CANDIDATES,
+                 workers=PARALLEL_WORKERS, threat_nodes=THREAT_NODES, tt=None, solver=None,
+                 vectorized=VECTORIZED, book=None):
+        self.depth = depth
+        self.time_limit = time_limit
+        self.width = width
+        self.workers = workers
+        self.vectorized = vectorized
+        self.book = book  # 可选的开局库（gomoku_book.OpeningBook）
+        self.tt = tt if tt is not None else TranspositionTable()
+        self.solver = solver if solver is not None else ThreatSolver(threat_nodes)
+        self.pondered = {}  # (局面, 行棋方) -> (落子, 统计)，由 ponder 在对手思考时填入
+        self.pool = None    # 并行搜索的常驻进程池，第一次并行搜索时创建
+        self.last = {}
+
+    def new_game(self):
+        # 进程池里不存对局状态（共享 alpha 每次搜索都会重置），跨对局继续复用
+        self.tt = TranspositionTable()
+        self.solver = ThreatSolver(self.solver.node_limit)
+        self.pondered = {}
+
+    def close(self):
+        """关闭并行搜索的进程池；之后再并行搜索会重新创建"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def ponder(self, board, player, stop, replies=PONDER_REPLIES):
+        """轮到 player（对手）思考时在后台调用：对其最可能的 replies 步应对，预先按正常强度算好我方的回应
+
+        只保存完整算完的结果；被 stop 打断的那一步不保存，但已写入置换表的内容照样留给之后的搜索。
+        调用方要保证 ponder 返回之后才调用 move（两者共用置换表）。
+        """
+        self.pondered = {}
+        own = AI if player == HUMAN else HUMAN
+        for r, c in order_moves(board, player, replies, vectorized=self.vectorized):
+            if stop.is_set():
+                return
+            child = board.copy()
+            child.place(r, c, player)
+            if child.is_win(r, c):
+                continue
+            move = self._move(child, own, stop)
+            if stop.is_set():
+                return
+            self.pondered[(child.to_bytes(), own)] = (move, self.last)
+
+    def move(self, board, player, stop=None):
+        """为 player 选一步棋
+
+        先查开局库，再在小节点预算内算杀（VCF/VCT），都没有结果时做 depth 层 alpha-beta 搜索；
+        depth 为 0 时只做一层启发式评分。
+        给出 time_limit（秒）或 stop 时改为迭代加深，到时或取消后返回已找到的最佳落子；
+        否则 workers 大于 0 时用多进程做根节点并行搜索。
+        对手思考时 ponder 已算好的局面直接返回结果。
+        """
+        hit = self.pondered.pop((board.to_bytes(), player), None) if self.pondered else None
+        self.pondered = {}
+        if hit is not None:
+            move, last = hit
+            self.last = dict(last, source="ponder", pondered=last["source"], time=0.0)
+            return move
+        return self._move(board, player, stop)
+
+    def _move(self, board, player, stop=None):
+        start = time.perf_counter()
+        move, source, nodes, depth = None, "greedy", 0, 0
+
+        if self.book is not None:
+            move = self.book.lookup(board, player)
+            source = "book"
+
+        # 若棋盘全空，走天元
+        if move is None and board.is_empty():
+            move, source = (board.size // 2, board.size // 2), "center"
+
+        if move is None and self.depth > 0 and self.solver.node_limit > 0:
+            deadline = start + self.time_limit if self.time_limit is not None else None
+            move = self.solver.solve(board, player, stop, deadline)
+            nodes += self.solver.nodes
+            source = "threat"
+        if move is None and self.depth > 0:
+            source = "search"
+            if self.time_limit is not None or stop is not None:
+                searcher = Searcher(self.depth, self.width, self.tt, stop)
+                # 算杀用掉的时间从本步的时间预算里扣除
+                time_limit = self.time_limit
+                if time_limit is not None:
+                    time_limit = max(0.0, time_limit - (time.perf_counter() - start))
+                move, _ = searcher.iterate(board, player, time_limit)
+                nodes, depth = nodes + searcher.nodes, searcher.depth_reached
+            elif self.workers:
+                if self.pool is None:
+                    self.pool = SearchPool(self.workers)
+                move, _, n = parallel_search(board, player, self.depth, width=self.width,
+                                             vectorized=self.vectorized, pool=self.pool)
+                nodes, depth = nodes + n, self.depth
+            else:
+                searcher = Searcher(self.depth, self.width, self.tt)
+                move, _ = searcher.search(board, player)
+                nodes, depth = nodes + searcher.nodes, searcher.depth_reached
+
+        if move is None:
+            moves = order_moves(board, player, 1, vectorized=self.vectorized)
+            move = moves[0] if moves else None
+            source = "greedy"
+        self.last = {"source": source, "nodes": nodes, "depth": depth,
+                     "time": time.perf_counter() - start}
+        return move
+
+
+def ai_move(board, depth=SEARCH_DEPTH, tt=None, time_limit=None, stop=None, solver=None,
+            workers=PARALLEL_WORKERS):
+    """AI选择最佳落子位置，参数含义见 Engine"""
+    engine = Engine(depth, time_limit, workers=workers, tt=tt, solver=solver)
+    try:
+        return engine.move(board, AI, stop)
+    finally:
+        engine.close()
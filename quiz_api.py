@@ -1,22 +1,76 @@
+import asyncio
+import hashlib
 import json
+import math
 import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
 from contextlib import asynccontextmanager
 
 try:
     from fastapi import FastAPI, HTTPException, Header
     from fastapi.middleware.cors import CORSMiddleware
-    from pydantic import BaseModel
+    from fastapi.responses import PlainTextResponse, StreamingResponse
+    from pydantic import BaseModel, ValidationError
     import uvicorn
 except ImportError:
     print("请先安装依赖：")
     print("  pip install fastapi uvicorn openai")
     raise SystemExit
 
-from openai import OpenAI
+import httpx
 
+import quiz_core
+from quiz_core import (
+    JSON_MODE, MODEL, PROMPT_TEMPLATE, QuizResponse, load_quiz, normalize_quiz, quiz_messages,
+    repair_json,
+)
+from quiz_metrics import MetricsMiddleware, Registry
+
+# 到 DeepSeek 的连接池：所有 API Key 共用一个 httpx 连接池，保持长连接
+MAX_CONNECTIONS = int(os.environ.get("DEEPSEEK_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE = int(os.environ.get("DEEPSEEK_MAX_KEEPALIVE", 20))
+KEEPALIVE_EXPIRY = float(os.environ.get("DEEPSEEK_KEEPALIVE_EXPIRY", 30))
+CLIENT_CACHE_SIZE = 16  # 最多缓存多少个不同 API Key 的客户端
+
+# 题目缓存：内存 LRU + TTL，设置 QUIZ_CACHE_DB 时再加一层重启后仍在的 SQLite
+CACHE_SIZE = int(os.environ.get("QUIZ_CACHE_SIZE", 1024))
+CACHE_TTL = float(os.environ.get("QUIZ_CACHE_TTL", 24 * 3600))
+CACHE_DB = os.environ.get("QUIZ_CACHE_DB", "")
+
+# 批量生成：同时进行的上游请求数、单次最多题数
+BATCH_CONCURRENCY = int(os.environ.get("QUIZ_BATCH_CONCURRENCY", 4))
+BATCH_MAX_ITEMS = int(os.environ.get("QUIZ_BATCH_MAX_ITEMS", 20))
+
+# 题库预生成：QUIZ_POOL_TOPICS 用分号分隔热门主题，需要环境变量里的 API Key
+POOL_TOPICS = [t.strip() for t in re.split(r"[;；\n]", os.environ.get("QUIZ_POOL_TOPICS", "")) if t.strip()]
+POOL_SIZE = int(os.environ.get("QUIZ_POOL_SIZE", 5))            # 每个主题补到多少道
+POOL_LOW_WATER = int(os.environ.get("QUIZ_POOL_LOW_WATER", 2))  # 少于多少道开始补
+POOL_CONCURRENCY = int(os.environ.get("QUIZ_POOL_CONCURRENCY", 2))
+POOL_MAX_BACKOFF = 60.0
 
-PROMPT_TEMPLATE = """根据以下内容，生成一道单选题。
-只返回 JSON，不要任何多余文字，格式如下：
+# 上游准入：全局与每个 API Key 的令牌桶（每秒请求数，<=0 不限）、排队上限和最长排队时间
+RATE_GLOBAL = float(os.environ.get("QUIZ_RATE_GLOBAL", 10))
+BURST_GLOBAL = int(os.environ.get("QUIZ_BURST_GLOBAL", 20))
+RATE_PER_KEY = float(os.environ.get("QUIZ_RATE_PER_KEY", 2))
+BURST_PER_KEY = int(os.environ.get("QUIZ_BURST_PER_KEY", 5))
+QUEUE_SIZE = int(os.environ.get("QUIZ_QUEUE_SIZE", 100))
+QUEUE_MAX_WAIT = float(os.environ.get("QUIZ_QUEUE_MAX_WAIT", 10))
+# 上游返回 429/5xx 或连接失败时的重试次数和退避基数（秒）
+UPSTREAM_RETRIES = int(os.environ.get("DEEPSEEK_RETRIES", 2))
+UPSTREAM_BACKOFF = float(os.environ.get("DEEPSEEK_BACKOFF", 0.5))
+UPSTREAM_MAX_BACKOFF = 10.0
+
+# 结构化输出：请求上游 JSON 模式；本地修复不了时再发一次简短的修复提示
+STRUCTURED_OUTPUT = os.environ.get("QUIZ_JSON_MODE", "1") != "0"
+REPAIR_PROMPT = os.environ.get("QUIZ_REPAIR_PROMPT", "1") != "0"
+
+MULTI_PROMPT_TEMPLATE = """根据以下内容，生成 {count} 道互不重复的单选题，尽量考查内容的不同方面。
+只返回 JSON 数组，不要任何多余文字，数组中每一项的格式如下：
 {{
   "question": "题目内容",
   "options": {{"A": "选项A内容", "B": "选项B内容", "C": "选项C内容", "D": "选项D内容"}},
@@ -27,13 +81,97 @@ PROMPT_TEMPLATE = """根据以下内容，生成一道单选题。
 用户输入内容：
 {content}"""
 
+REPAIR_PROMPT_TEMPLATE = """下面这段单选题 JSON 有错误：{error}
+请修正后只返回 JSON，格式为 {{"question": ..., "options": {{"A": ..., "B": ..., "C": ..., "D": ...}}, "answer": "A/B/C/D 之一", "explanation": ...}}。
+
+{content}"""
+
+# 提示词一改，旧缓存自动失效
+PROMPT_VERSION = hashlib.sha256(PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+# /metrics 暴露的指标
+METRICS = Registry()
+HTTP_REQUESTS = METRICS.counter("quiz_http_requests_total", "HTTP 请求数", ("method", "path", "status"))
+HTTP_LATENCY = METRICS.histogram("quiz_http_request_duration_seconds", "HTTP 请求耗时", ("path",))
+HTTP_IN_FLIGHT = METRICS.gauge("quiz_http_requests_in_flight", "正在处理的 HTTP 请求数")
+STAGE_LATENCY = METRICS.histogram("quiz_stage_duration_seconds",
+                                  "各阶段耗时：admission 排队、upstream 上游、extract 提取 JSON、validate 校验",
+                                  ("stage",))
+UPSTREAM_IN_FLIGHT = METRICS.gauge("quiz_upstream_requests_in_flight", "正在进行的上游请求数")
+UPSTREAM_RETRIES_TOTAL = METRICS.counter("quiz_upstream_retries_total", "上游请求重试次数")
+UPSTREAM_TOKENS = METRICS.counter("quiz_upstream_tokens_total", "上游消耗的 token 数", ("type",))
+CACHE_REQUESTS = METRICS.counter("quiz_cache_requests_total", "缓存查询次数", ("tier", "result"))
+CACHE_HIT_RATIO = METRICS.gauge("quiz_cache_hit_ratio", "缓存命中率（内存层或 SQLite 层命中 / 查询）")
+POOL_REQUESTS = METRICS.counter("quiz_pool_requests_total", "预生成题库的取题次数", ("result",))
+REPAIRS = METRICS.counter("quiz_repairs_total", "格式修复次数：local 本地修复、prompt 修复提示",
+                          ("kind", "result"))
+COALESCED = METRICS.counter("quiz_coalesced_requests_total", "合并到已有上游请求上的请求数")
+ERRORS = METRICS.counter("quiz_errors_total", "按类型统计的错误数", ("type",))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                            max_keepalive_connections=MAX_KEEPALIVE,
+                            keepalive_expiry=KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+    app.state.clients = OrderedDict()
+    app.state.cache = QuizCache(CACHE_SIZE, CACHE_TTL, CACHE_DB or None)
+    app.state.inflight = {}  # (缓存键, API Key) -> 正在进行的上游请求
+    app.state.batch_limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+    app.state.admission = Admission()
+    app.state.pool = QuizPool(POOL_TOPICS, POOL_SIZE, POOL_LOW_WATER, POOL_CONCURRENCY)
+    env_key = os.environ.get("DEEPSEEK_API_KEY", "")
+    # openai 在后台线程里导入，不挡住启动和健康检查；上游调用前会等它完成
+    app.state.openai_ready = asyncio.create_task(warm_up(env_key))
+    pool_task = None
+    if env_key:
+        if app.state.pool.topics:
+            pool_task = asyncio.create_task(app.state.pool.run(env_key))
+    yield
+    if pool_task is not None:
+        pool_task.cancel()
+        await asyncio.gather(pool_task, return_exceptions=True)
+    app.state.openai_ready.cancel()
+    await asyncio.gather(app.state.openai_ready, return_exceptions=True)
+    await app.state.http_client.aclose()
+    app.state.cache.close()
+
+
+async def warm_up(env_key):
+    await asyncio.to_thread(quiz_core.openai_module)
+    if env_key:
+        get_client(env_key)
+
+
+def get_client(api_key):
+    """按 API Key 取共用连接池的客户端，最近最少使用的先被淘汰"""
+    clients = app.state.clients
+    client = clients.get(api_key)
+    if client is None:
+        # 重试由 chat_completion 统一做（带抖动的指数退避），客户端自身不再重试
+        client = quiz_core.make_async_client(api_key, max_retries=0,
+                                             http_client=app.state.http_client)
+        clients[api_key] = client
+        if len(clients) > CLIENT_CACHE_SIZE:
+            # 连接池是共用的，淘汰时只丢弃客户端对象，不关闭连接
+            clients.popitem(last=False)
+    else:
+        clients.move_to_end(api_key)
+    return client
+
 
 app = FastAPI(
     title="AI 选择题生成器",
     description="输入任意内容，自动生成一道单选题",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+app.add_middleware(MetricsMiddleware, requests=HTTP_REQUESTS, latency=HTTP_LATENCY,
+                   in_flight=HTTP_IN_FLIGHT)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -45,53 +183,718 @@ app.add_middleware(
 class GenerateRequest(BaseModel):
     content: str
     api_key: str | None = None  # 可选，优先使用环境变量
+    fresh: bool = False         # 为 true 时跳过缓存，重新生成一道题
+    stream: bool = False        # 为 true 时以 SSE 逐字段推送
+
+
+class BatchRequest(BaseModel):
+    contents: list[str] | None = None  # 每段内容各出一题
+    content: str | None = None         # 或者同一段内容出 count 道题
+    count: int = 1
+    combined: bool = False             # 为 true 时 count 道题在一次补全里生成（仅用于 content）
+    api_key: str | None = None
+    fresh: bool = False
+
+
+class BatchItem(BaseModel):
+    status: int                        # 与单题接口一致的状态码
+    quiz: QuizResponse | None = None
+    error: str | None = None
+
+
+class BatchResponse(BaseModel):
+    items: list[BatchItem]
+
+
+def normalize(content):
+    """去首尾空白、合并连续空白"""
+    return " ".join(content.split())
+
+
+def cache_key(content):
+    """规范化后的内容连同模型和提示词版本一起取哈希"""
+    return hashlib.sha256(f"{MODEL}\0{PROMPT_VERSION}\0{normalize(content)}".encode("utf-8")).hexdigest()
+
+
+class QuizCache:
+    """按内容哈希缓存校验过的题目：内存 LRU + TTL，可选 SQLite 持久层"""
+
+    def __init__(self, max_items=CACHE_SIZE, ttl=CACHE_TTL, db_path=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (过期时刻, QuizResponse)
+        self._db = None
+        self._lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS quiz_cache "
+                             "(key TEXT PRIMARY KEY, data TEXT NOT NULL, created REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS quiz_cache_created ON quiz_cache (created)")
+            with self._db:
+                self._purge()
+
+    @property
+    def persistent(self):
+        return self._db is not None
+
+    def get(self, key):
+        """只查内存层"""
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return item[1]
+
+    def put(self, key, quiz, created=None):
+        """created 是题目生成时的 time.time()，默认为现在；过期时刻按生成时间算，不因回填而延长"""
+        age = 0.0 if created is None else max(0.0, time.time() - created)
+        self._items[key] = (time.monotonic() + self.ttl - age, quiz)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def load(self, key):
+        """查 SQLite 层，返回未过期的 (题目, 写入时间)（阻塞，放在线程里调用；放回内存层由调用方在事件循环里做）"""
+        with self._lock:
+            row = self._db.execute("SELECT data, created FROM quiz_cache WHERE key = ?",
+                                   (key,)).fetchone()
+        if row is None or row[1] + self.ttl < time.time():
+            return None
+        try:
+            quiz = QuizResponse.model_validate_json(row[0])
+        except ValidationError:
+            return None  # 旧版本写入、已不符合当前格式的记录
+        return quiz, row[1]
+
+    def store(self, key, quiz):
+        """写入 SQLite 层，顺带删掉过期记录（阻塞，放在线程里调用）"""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO quiz_cache VALUES (?, ?, ?)",
+                             (key, quiz.model_dump_json(), time.time()))
+            self._purge()
+
+    def _purge(self):
+        self._db.execute("DELETE FROM quiz_cache WHERE created < ?", (time.time() - self.ttl,))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class QuizPool:
+    """热门主题的预生成题库：每个主题一个队列，后台任务在低于低水位时补满
+
+    所有主题的补题共用一个并发上限；某个主题出错后按指数退避（带抖动）再试。
+    """
+
+    def __init__(self, topics, size=POOL_SIZE, low_water=POOL_LOW_WATER, concurrency=POOL_CONCURRENCY):
+        self.topics = {normalize(t): t for t in topics}
+        self.size = size
+        self.low_water = low_water
+        self._queues = {t: deque() for t in self.topics}
+        self._failures = dict.fromkeys(self.topics, 0)
+        self._retry_at = dict.fromkeys(self.topics, 0.0)
+        self._filling = set()
+        self._limit = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+
+    def pop(self, content):
+        """内容是池中主题且有存货时取出一道，否则返回 None"""
+        queue = self._queues.get(normalize(content))
+        if queue is None:
+            return None
+        if not queue:
+            POOL_REQUESTS.inc("miss")
+            return None
+        POOL_REQUESTS.inc("hit")
+        quiz = queue.popleft()
+        if len(queue) < self.low_water:
+            self._wakeup.set()
+        return quiz
+
+    async def run(self, api_key):
+        """后台补题循环，由 lifespan 启动和取消"""
+        tasks = set()
+        try:
+            while True:
+                self._wakeup.clear()
+                now = time.monotonic()
+                for topic, queue in self._queues.items():
+                    if (len(queue) < self.low_water and topic not in self._filling
+                            and now >= self._retry_at[topic]):
+                        self._filling.add(topic)
+                        task = asyncio.create_task(self._fill(topic, api_key))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _fill(self, topic, api_key):
+        queue = self._queues[topic]
+        try:
+            while len(queue) < self.size:
+                async with self._limit:
+                    quiz = await request_quiz(api_key, self.topics[topic])
+                queue.append(quiz)
+                self._failures[topic] = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._failures[topic] += 1
+            delay = min(POOL_MAX_BACKOFF, 2 ** self._failures[topic])
+            self._retry_at[topic] = time.monotonic() + delay * random.uniform(0.5, 1.0)
+        finally:
+            self._filling.discard(topic)
+            self._wakeup.set()
+
+
+async def cache_lookup(key):
+    cache = app.state.cache
+    quiz = cache.get(key)
+    CACHE_REQUESTS.inc("memory", "miss" if quiz is None else "hit")
+    if quiz is None and cache.persistent:
+        row = await asyncio.to_thread(cache.load, key)
+        CACHE_REQUESTS.inc("sqlite", "miss" if row is None else "hit")
+        if row is not None:
+            quiz, created = row
+            cache.put(key, quiz, created)
+    return quiz
+
+
+async def cache_save(key, quiz):
+    cache = app.state.cache
+    cache.put(key, quiz)
+    if cache.persistent:
+        await asyncio.to_thread(cache.store, key, quiz)
+
+
+class TokenBucket:
+    """令牌桶：每秒补 rate 个令牌，最多存 burst 个
+
+    令牌可以预支（tokens 变成负数），排在后面的请求预约的是更晚的令牌，
+    所以等待时间随排队人数增加，先到先得。
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def delay(self):
+        """现在预约一个令牌要等多少秒，有空闲令牌时返回 0"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def refund(self):
+        """预约了却没用上（等待中被取消）时还回去"""
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+
+class Admission:
+    """上游请求的准入控制：全局和每个 API Key 各一个令牌桶，拿不到令牌时有限排队
+
+    每个请求进来时就按到达顺序预约令牌，算出自己的放行时刻；排队人数已满或
+    放行时刻晚于 max_wait 时当场拒绝，不再排到超时：Key 自身超速是 429，整体超载是 503，
+    Retry-After 取预约令牌的时刻。
+    """
+
+    def __init__(self, rate=RATE_GLOBAL, burst=BURST_GLOBAL, key_rate=RATE_PER_KEY,
+                 key_burst=BURST_PER_KEY, queue_size=QUEUE_SIZE, max_wait=QUEUE_MAX_WAIT):
+        self.bucket = TokenBucket(rate, burst)
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.waiting = 0
+        self._keys = OrderedDict()
+
+    def _key_bucket(self, api_key):
+        bucket = self._keys.get(api_key)
+        if bucket is None:
+            bucket = self._keys[api_key] = TokenBucket(self.key_rate, self.key_burst)
+            if len(self._keys) > 1024:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(api_key)
+        return bucket
+
+    async def acquire(self, api_key):
+        key_bucket = self._key_bucket(api_key)
+        key_wait = key_bucket.delay()
+        wait = max(key_wait, self.bucket.delay())
+        if wait > self.max_wait:
+            if key_wait >= wait:
+                raise overload(429, "请求过于频繁，请稍后重试", wait)
+            raise overload(503, "服务繁忙，请稍后重试", wait)
+        if wait > 0 and self.waiting >= self.queue_size:
+            raise overload(503, "服务繁忙，请稍后重试", wait)
+        key_bucket.take()
+        self.bucket.take()
+        if wait == 0:
+            return
+        self.waiting += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            key_bucket.refund()
+            self.bucket.refund()
+            raise
+        finally:
+            self.waiting -= 1
+
+
+def overload(status, detail, retry_after):
+    return HTTPException(status_code=status, detail=detail,
+                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+def retry_delay(attempt, error):
+    """优先用上游给的 Retry-After，否则指数退避加抖动"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(UPSTREAM_MAX_BACKOFF, float(response.headers.get("retry-after", "")))
+        except ValueError:
+            pass
+    return min(UPSTREAM_MAX_BACKOFF, UPSTREAM_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+async def chat_completion(api_key, **kwargs):
+    """经过准入控制调用上游，429/5xx/连接失败时退避重试"""
+    with STAGE_LATENCY.time("admission"):
+        await app.state.admission.acquire(api_key)
+    await app.state.openai_ready
+    client = get_client(api_key)
+    openai = quiz_core.openai_module()
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        try:
+            with UPSTREAM_IN_FLIGHT.track(), STAGE_LATENCY.time("upstream"):
+                response = await client.chat.completions.create(model=MODEL, **kwargs)
+            if not kwargs.get("stream"):
+                record_usage(response.usage)
+            return response
+        except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+            if attempt == UPSTREAM_RETRIES:
+                raise
+            UPSTREAM_RETRIES_TOTAL.inc()
+            await asyncio.sleep(retry_delay(attempt, e))
 
 
-class Option(BaseModel):
-    A: str
-    B: str
-    C: str
-    D: str
+def record_usage(usage):
+    if usage is not None:
+        UPSTREAM_TOKENS.inc("prompt", amount=usage.prompt_tokens)
+        UPSTREAM_TOKENS.inc("completion", amount=usage.completion_tokens)
 
 
-class QuizResponse(BaseModel):
-    question: str
-    options: Option
-    answer: str
-    explanation: str
+async def request_quiz(api_key, content):
+    """向 DeepSeek 请求一道题并校验成 QuizResponse"""
+    response = await chat_completion(
+        api_key,
+        max_tokens=1024,
+        messages=quiz_messages(content),
+        **json_mode()
+    )
+    return await finish_quiz(api_key, response.choices[0].message.content)
+
+
+def json_mode():
+    return {"response_format": JSON_MODE} if STRUCTURED_OUTPUT else {}
+
+
+def parse_quiz(raw):
+    """先按标准 JSON 直接校验（JSON 模式下通常一次通过），失败再本地修复后校验"""
+    try:
+        with STAGE_LATENCY.time("validate"):
+            return QuizResponse.model_validate_json(raw)
+    except ValidationError:
+        pass
+    try:
+        with STAGE_LATENCY.time("extract"):
+            data = load_quiz(raw)
+        quiz = QuizResponse(**data)
+    except (json.JSONDecodeError, ValidationError):
+        REPAIRS.inc("local", "fail")
+        raise
+    REPAIRS.inc("local", "ok")
+    return quiz
+
+
+async def finish_quiz(api_key, raw):
+    """校验模型回复；本地修复也不行时，让模型只修正这段 JSON，而不是整题重新生成"""
+    try:
+        return parse_quiz(raw)
+    except (json.JSONDecodeError, ValidationError) as e:
+        if not REPAIR_PROMPT:
+            raise
+        error = e.errors()[0]["msg"] if isinstance(e, ValidationError) else str(e)
+    response = await chat_completion(
+        api_key,
+        max_tokens=1024,
+        messages=quiz_messages(raw, REPAIR_PROMPT_TEMPLATE, error=error),
+        **json_mode()
+    )
+    try:
+        quiz = parse_quiz(response.choices[0].message.content)
+    except (json.JSONDecodeError, ValidationError):
+        REPAIRS.inc("prompt", "fail")
+        raise
+    REPAIRS.inc("prompt", "ok")
+    return quiz
+
+
+class QuizStreamParser:
+    """增量 JSON 解析：边接收边找出已经完整的字符串字段
+
+    feed() 返回新完成的 (路径, 值) 列表，路径如 ("question",)、("options", "A")。
+    只关心字符串值，数字等其他值跳过，容器的嵌套层次照常跟踪。
+    """
+
+    def __init__(self):
+        self.started = False
+        self.done = False
+        self._stack = []         # 每层 [路径, 当前键, 是否在等键, 是否对象]
+        self._in_string = False
+        self._escape = False
+        self._chars = []
+
+    def feed(self, text):
+        fields = []
+        for ch in text:
+            if self.done:
+                break
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self._stack.append([(), None, True, True])
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._string_done("".join(self._chars), fields)
+                    continue
+                self._chars.append(ch)
+                continue
+
+            top = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._chars = []
+            elif ch == ":":
+                top[2] = False
+            elif ch == ",":
+                top[2] = top[3]
+            elif ch in "{[":
+                self._stack.append([top[0] + (top[1],), None, ch == "{", ch == "{"])
+            elif ch in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+        return fields
+
+    def _string_done(self, raw, fields):
+        # 允许字符串里出现未转义的换行、制表符；转义本身有误时原样作键、跳过该字段，留给结束后的整体校验和修复
+        try:
+            value = json.loads('"' + raw + '"', strict=False)
+        except json.JSONDecodeError:
+            value = None
+        top = self._stack[-1]
+        if top[2]:
+            top[1] = raw if value is None else value
+        elif top[1] is not None and value is not None:
+            fields.append((top[0] + (top[1],), value))
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def field_event(path, value):
+    """把解析出的字段转成 SSE 事件，不认识的字段返回 None"""
+    if path == ("question",):
+        return sse("question", value)
+    if len(path) == 2 and path[0] == "options":
+        return sse("option", {"key": path[1], "text": value})
+    if path == ("answer",):
+        return sse("answer", value)
+    if path == ("explanation",):
+        return sse("explanation", value)
+    return None
+
+
+def quiz_events(quiz):
+    """缓存命中时一次性推送全部字段"""
+    yield sse("question", quiz.question)
+    for key, text in quiz.options.model_dump().items():
+        yield sse("option", {"key": key, "text": text})
+    yield sse("answer", quiz.answer)
+    yield sse("explanation", quiz.explanation)
+    yield sse("quiz", quiz.model_dump())
+
+
+async def stream_events(stream, api_key, key):
+    """逐块读取上游流，字段一完整就推送；结束后整体校验（必要时修复），推送 quiz 或 error 并写缓存"""
+    parser = QuizStreamParser()
+    parts = []
+    try:
+        async for chunk in stream:
+            record_usage(getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content or ""
+            parts.append(text)
+            for path, value in parser.feed(text):
+                event = field_event(path, value)
+                if event:
+                    yield event
+    except Exception as e:
+        error = upstream_error(e)
+        yield sse("error", {"status": error.status_code, "detail": error.detail})
+        return
+    finally:
+        await stream.close()
+    try:
+        quiz = await finish_quiz(api_key, "".join(parts))
+    except Exception as e:
+        error = upstream_error(e)
+        yield sse("error", {"status": error.status_code, "detail": error.detail})
+        return
+    await cache_save(key, quiz)
+    yield sse("quiz", quiz.model_dump())
+
+
+async def stream_quiz(api_key, key, content, cached):
+    """SSE 版本的 /generate：依次推送 question、option（每个选项一次）、answer、explanation，
+    最后推送校验过的完整题目 quiz，出错时推送 error"""
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if cached is not None:
+        return StreamingResponse(quiz_events(cached), media_type="text/event-stream",
+                                 headers=headers)
+    try:
+        stream = await chat_completion(
+            api_key,
+            max_tokens=1024,
+            stream=True,
+            stream_options={"include_usage": True},
+            messages=quiz_messages(content),
+            **json_mode()
+        )
+    except Exception as e:
+        raise upstream_error(e)
+    return StreamingResponse(stream_events(stream, api_key, key), media_type="text/event-stream",
+                             headers=headers)
+
+
+async def request_quizzes(api_key, content, count):
+    """一次补全生成多道题，返回列表（可能少于 count）；校验不通过的题目位置为 None，不影响其他题"""
+    response = await chat_completion(
+        api_key,
+        max_tokens=min(8192, 800 * count),
+        messages=quiz_messages(content, MULTI_PROMPT_TEMPLATE, count=count)
+    )
+    raw = response.choices[0].message.content
+    data = repair_json(raw, "[", "]")
+    if not isinstance(data, list):
+        raise json.JSONDecodeError("不是 JSON 数组", raw, 0)
+    quizzes = []
+    for item in data[:count]:
+        try:
+            quizzes.append(QuizResponse(**normalize_quiz(item)))
+        except (TypeError, ValidationError) as e:
+            ERRORS.inc(type(e).__name__)
+            quizzes.append(None)
+    return quizzes
+
+
+def upstream_error(e):
+    """把生成过程中的异常转成对外的 HTTPException，并按类型计数"""
+    ERRORS.inc(f"http_{e.status_code}" if isinstance(e, HTTPException) else type(e).__name__)
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, (json.JSONDecodeError, ValidationError)):
+        return HTTPException(status_code=502, detail="AI 返回格式异常，请重试")
+    openai = quiz_core.openai_module()
+    if isinstance(e, openai.RateLimitError):
+        return overload(429, "上游限流，请稍后重试", retry_delay(0, e))
+    if isinstance(e, openai.APITimeoutError):
+        return HTTPException(status_code=504, detail="上游响应超时，请重试")
+    if isinstance(e, (openai.InternalServerError, openai.APIConnectionError)):
+        return HTTPException(status_code=502, detail="上游服务异常，请稍后重试")
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def resolve_api_key(api_key):
+    api_key = api_key or os.environ.get("DEEPSEEK_API_KEY", "")
+    if not api_key:
+        raise HTTPException(status_code=400, detail="缺少 API Key，请在请求体或环境变量 DEEPSEEK_API_KEY 中提供")
+    return api_key
+
+
+async def generate_and_cache(key, api_key, content):
+    quiz = await request_quiz(api_key, content)
+    await cache_save(key, quiz)
+    return quiz
+
+
+def _finish_flight(flight_key, task):
+    inflight = app.state.inflight
+    if inflight.get(flight_key) is task:
+        del inflight[flight_key]
+    if not task.cancelled():
+        task.exception()  # 所有等待者都已断开时，避免"异常未被取回"的警告
+
+
+async def coalesced_quiz(key, api_key, content):
+    """相同内容（且同一 API Key）的并发请求只发一次上游调用，结果或异常共享给所有等待者
+
+    上游调用在独立任务里进行，并用 shield 等待：某个客户端断开只取消它自己的等待，
+    不会取消共享的调用，生成的题目照样写入缓存。
+    """
+    flight_key = (key, api_key)
+    task = app.state.inflight.get(flight_key)
+    if task is None:
+        task = asyncio.create_task(generate_and_cache(key, api_key, content))
+        app.state.inflight[flight_key] = task
+        task.add_done_callback(lambda t: _finish_flight(flight_key, t))
+    else:
+        COALESCED.inc()
+    return await asyncio.shield(task)
 
 
 @app.post("/generate", response_model=QuizResponse, summary="生成选择题")
-def generate_quiz(req: GenerateRequest):
+async def generate_quiz(req: GenerateRequest):
     """
     根据输入内容生成一道单选题。
 
     - **content**: 输入的文本内容或主题
     - **api_key**: DeepSeek API Key（也可通过环境变量 DEEPSEEK_API_KEY 设置）
+    - **fresh**: 为 true 时不使用缓存，重新生成
+    - **stream**: 为 true 时返回 text/event-stream，字段生成一个推送一个
     """
-    api_key = req.api_key or os.environ.get("DEEPSEEK_API_KEY", "")
-    if not api_key:
-        raise HTTPException(status_code=400, detail="缺少 API Key，请在请求体或环境变量 DEEPSEEK_API_KEY 中提供")
+    api_key = resolve_api_key(req.api_key)
 
     if not req.content.strip():
         raise HTTPException(status_code=400, detail="content 不能为空")
 
+    key = cache_key(req.content)
+    # 预生成题库里的题每道只发一次，比缓存更优先，也满足 fresh
+    quiz = app.state.pool.pop(req.content)
+    if quiz is None and not req.fresh:
+        quiz = await cache_lookup(key)
+    if req.stream:
+        return await stream_quiz(api_key, key, req.content, quiz)
+    if quiz is not None:
+        return quiz
+
     try:
-        client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            max_tokens=1024,
-            messages=[{"role": "user", "content": PROMPT_TEMPLATE.format(content=req.content)}]
-        )
-        raw = response.choices[0].message.content.strip()
-        start = raw.find("{")
-        end = raw.rfind("}") + 1
-        data = json.loads(raw[start:end])
-        return data
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=502, detail="AI 返回格式异常，请重试")
+        if req.fresh:
+            # fresh 要的是一道新题，不能搭别人正在进行的请求；生成后照样刷新缓存
+            return await generate_and_cache(key, api_key, req.content)
+        return await coalesced_quiz(key, api_key, req.content)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise upstream_error(e)
+
+
+async def batch_item(api_key, content, fresh, repeat):
+    """批量中的一项：内容第一次出现时走缓存和请求合并，fresh 或重复出现的另外生成一道新题"""
+    if not content.strip():
+        return BatchItem(status=400, error="content 不能为空")
+    key = cache_key(content)
+    quiz = app.state.pool.pop(content)
+    if quiz is not None:
+        return BatchItem(status=200, quiz=quiz)
+    try:
+        if not fresh and not repeat:
+            quiz = await cache_lookup(key)
+            if quiz is not None:
+                return BatchItem(status=200, quiz=quiz)
+        async with app.state.batch_limit:
+            if repeat:
+                quiz = await request_quiz(api_key, content)
+            elif fresh:
+                quiz = await generate_and_cache(key, api_key, content)
+            else:
+                quiz = await coalesced_quiz(key, api_key, content)
+        return BatchItem(status=200, quiz=quiz)
+    except Exception as e:
+        error = upstream_error(e)
+        return BatchItem(status=error.status_code, error=error.detail)
+
+
+@app.post("/generate/batch", response_model=BatchResponse, summary="批量生成选择题")
+async def generate_batch(req: BatchRequest):
+    """
+    一次生成多道单选题，结果按输入顺序返回，单项失败不影响其他项。
+
+    - **contents**: 内容列表，每段各出一题
+    - **content** + **count**: 同一段内容出 count 道题
+    - **combined**: 为 true 时 count 道题在一次补全里生成，省去重复的提示词开销
+    - **api_key**、**fresh**: 同 /generate
+    """
+    api_key = resolve_api_key(req.api_key)
+
+    if req.contents is not None:
+        contents = req.contents
+    elif req.content is not None:
+        contents = [req.content] * req.count
+    else:
+        raise HTTPException(status_code=400, detail="需要提供 contents 或 content")
+    if not 0 < len(contents) <= BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"题目数量需在 1 到 {BATCH_MAX_ITEMS} 之间")
+
+    if req.combined and req.contents is None:
+        if not req.content.strip():
+            raise HTTPException(status_code=400, detail="content 不能为空")
+        try:
+            async with app.state.batch_limit:
+                quizzes = await request_quizzes(api_key, req.content, req.count)
+        except Exception as e:
+            raise upstream_error(e)
+        items = [BatchItem(status=200, quiz=quiz) if quiz is not None
+                 else BatchItem(status=502, error="AI 返回格式异常，请重试") for quiz in quizzes]
+        items += [BatchItem(status=502, error="AI 返回的题目数量不足")] * (req.count - len(items))
+        return BatchResponse(items=items)
+
+    seen = set()
+    tasks = []
+    for content in contents:
+        normalized = normalize(content)
+        tasks.append(batch_item(api_key, content, req.fresh, normalized in seen))
+        seen.add(normalized)
+    return BatchResponse(items=await asyncio.gather(*tasks))
+
+
+@app.get("/metrics", summary="Prometheus 指标", response_class=PlainTextResponse)
+async def metrics():
+    lookups = CACHE_REQUESTS.value("memory", "hit") + CACHE_REQUESTS.value("memory", "miss")
+    hits = CACHE_REQUESTS.value("memory", "hit") + CACHE_REQUESTS.value("sqlite", "hit")
+    CACHE_HIT_RATIO.set(hits / lookups if lookups else 0.0)
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/", summary="健康检查")
@@ -101,4 +904,5 @@ def root():
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("quiz_api:app", host="0.0.0.0", port=port)
+    # 直接传 app 对象，避免 uvicorn 按字符串再导入一遍本模块
+    uvicorn.run(app, host="0.0.0.0", port=port)
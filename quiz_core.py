@@ -0,0 +1,154 @@
+"""quiz_api 和 quiz_generator 共用的出题核心：提示词、客户端创建、JSON 提取
+
+openai 导入要半秒以上，这里不在模块加载时导入，第一次用到时才导入；题目模型用到的 pydantic 同理。
+warm_up() 可以在启动时放到后台线程里提前导入，不拖慢启动。
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Literal
+
+# 可指向 quiz_mock_llm.py 启动的本地模拟服务做离线压测
+BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+MODEL = "deepseek-chat"
+
+PROMPT_TEMPLATE = """根据以下内容，生成一道单选题。
+只返回 JSON，不要任何多余文字，格式如下：
+{{
+  "question": "题目内容",
+  "options": {{"A": "选项A内容", "B": "选项B内容", "C": "选项C内容", "D": "选项D内容"}},
+  "answer": "A",
+  "explanation": "答案解析"
+}}
+
+用户输入内容：
+{content}"""
+
+
+def openai_module():
+    """按需导入 openai，之后的调用直接取 sys.modules 里的模块"""
+    import openai
+    return openai
+
+
+def make_client(api_key, **kwargs):
+    return openai_module().OpenAI(api_key=api_key, base_url=BASE_URL, **kwargs)
+
+
+def make_async_client(api_key, **kwargs):
+    return openai_module().AsyncOpenAI(api_key=api_key, base_url=BASE_URL, **kwargs)
+
+
+def warm_up():
+    """在后台线程里导入 openai，返回线程；缺少依赖时留到真正使用时再报错"""
+    def run():
+        try:
+            openai_module()
+            quiz_models()
+        except ImportError:
+            pass
+
+    thread = threading.Thread(target=run, name="quiz-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def quiz_messages(content, template=PROMPT_TEMPLATE, **fields):
+    return [{"role": "user", "content": template.format(content=content, **fields)}]
+
+
+# 结构化输出：要求上游直接返回 JSON 对象（DeepSeek 的 JSON 模式）
+JSON_MODE = {"type": "json_object"}
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.S | re.I)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_ANSWER = re.compile(r"(?<![A-Z])([A-D])(?![A-Z])")
+
+
+def extract_json(raw, open_char="{", close_char="}"):
+    """从模型回复里截取第一个 open_char 到最后一个 close_char 之间的 JSON 并解析"""
+    raw = raw.strip()
+    start = raw.find(open_char)
+    end = raw.rfind(close_char) + 1
+    return json.loads(raw[start:end])
+
+
+def repair_json(raw, open_char="{", close_char="}"):
+    """本地修复常见的小毛病再解析：代码块围栏、前后多余文字、末尾多余逗号"""
+    match = _FENCE.search(raw)
+    if match:
+        raw = match.group(1)
+    try:
+        return extract_json(raw, open_char, close_char)
+    except json.JSONDecodeError:
+        start = raw.find(open_char)
+        end = raw.rfind(close_char) + 1
+        return json.loads(_TRAILING_COMMA.sub(r"\1", raw[start:end]))
+
+
+def normalize_quiz(data):
+    """把题目字典里可以确定意思的写法规范化：小写或带说明的答案、小写选项键、列表形式的选项"""
+    if not isinstance(data, dict):
+        return data
+    answer = str(data.get("answer", "")).strip().upper()
+    match = _ANSWER.search(answer)
+    if match:
+        data["answer"] = match.group(1)
+    options = data.get("options")
+    if isinstance(options, list) and len(options) == 4:
+        data["options"] = dict(zip("ABCD", options))
+    elif isinstance(options, dict):
+        data["options"] = {str(k).strip().rstrip(".、:：").upper(): v for k, v in options.items()}
+    return data
+
+
+def load_quiz(raw):
+    """解析模型回复为题目字典，必要时先本地修复"""
+    return normalize_quiz(repair_json(raw))
+
+
+
+_models = None
+_models_lock = threading.Lock()
+
+
+def _build_models():
+    """题目的 pydantic 模型，quiz_api 和 quiz_generator 共用同一份定义"""
+    from pydantic import BaseModel
+
+    class Option(BaseModel):
+        A: str
+        B: str
+        C: str
+        D: str
+
+    class QuizResponse(BaseModel):
+        question: str
+        options: Option
+        answer: Literal["A", "B", "C", "D"]
+        explanation: str
+
+    return {"Option": Option, "QuizResponse": QuizResponse}
+
+
+def quiz_models():
+    """按需导入 pydantic 并定义题目模型，返回 {名字: 模型类}，之后的调用直接取已定义的"""
+    global _models
+    with _models_lock:
+        if _models is None:
+            _models = _build_models()
+    return _models
+
+
+def __getattr__(name):
+    # 让 quiz_core.QuizResponse、from quiz_core import Option 这样的写法也按需定义
+    if name in ("Option", "QuizResponse"):
+        return quiz_models()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def validate_quiz(data):
+    """按 QuizResponse 校验题目字典，返回规范后的字典；不符合时抛 pydantic 的 ValidationError（ValueError 的子类）"""
+    return quiz_models()["QuizResponse"].model_validate(data).model_dump()
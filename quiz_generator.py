@@ -1,14 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
 
-try:
-    from openai import OpenAI
-except ImportError:
-    messagebox.showerror("缺少依赖", "请先运行：pip install openai")
-    raise SystemExit
+import quiz_core
+from quiz_core import JSON_MODE, MODEL, load_quiz, quiz_messages, validate_quiz
 
 
 BG     = "#1a1a2e"
@@ -17,17 +15,8 @@ FG     = "#e2e8f0"
 FG2    = "#a0aec0"
 ACCENT = "#667eea"
 
-PROMPT_TEMPLATE = """根据以下内容，生成一道单选题。
-只返回 JSON，不要任何多余文字，格式如下：
-{{
-  "question": "题目内容",
-  "options": {{"A": "选项A内容", "B": "选项B内容", "C": "选项C内容", "D": "选项D内容"}},
-  "answer": "A",
-  "explanation": "答案解析"
-}}
-
-用户输入内容：
-{content}"""
+PREFETCH = 3  # 答题期间在后台预先生成几道题
+WORKERS = 2   # 后台生成线程数
 
 
 class QuizApp:
@@ -40,7 +29,24 @@ class QuizApp:
         self.answer_var = tk.StringVar()
         self.correct_answer = None
 
+        # 长期复用的客户端和后台线程池；ready 是已生成好、还没展示的题
+        self.client = None
+        self.client_key = None
+        self.executor = ThreadPoolExecutor(max_workers=WORKERS)
+        self.request_key = None   # 当前预取针对的 (API Key, 内容)
+        self.generation = 0       # 输入变化时加一，旧批次的结果直接丢弃
+        self.pending = set()
+        self.ready = deque()
+        self.waiting = False      # 界面正在等一道题
+        self.closed = False       # 窗口已关闭，后台任务完成后不再回调界面
+
         self._build_ui()
+        self.input_text.edit_modified(False)
+        self.input_text.bind("<<Modified>>", self._on_input_changed)
+        self.key_entry.bind("<KeyRelease>", self._on_input_changed)
+        self.root.protocol("WM_DELETE_WINDOW", self._close)
+        # 界面先出来，openai 在后台导入，第一次点生成时通常已经导入完
+        quiz_core.warm_up()
 
     def _build_ui(self):
         tk.Label(self.root, text="AI 选择题生成器", font=("微软雅黑", 18, "bold"),
@@ -132,29 +138,104 @@ class QuizApp:
             messagebox.showwarning("提示", "请输入内容或主题")
             return
 
-        self._reset_question()
-        self.gen_btn.config(state=tk.DISABLED, text="生成中...")
-        self.question_label.config(text="AI 思考中，请稍候...", fg=ACCENT)
-
-        threading.Thread(target=self._generate, args=(api_key, content), daemon=True).start()
+        if (api_key, content) != self.request_key:
+            self._cancel_prefetch()
+            self.request_key = (api_key, content)
+        if api_key != self.client_key:
+            try:
+                self.client = quiz_core.make_client(api_key)
+            except ImportError:
+                messagebox.showerror("缺少依赖", "请先运行：pip install openai")
+                return
+            self.client_key = api_key
 
-    def _generate(self, api_key, content):
+        self._reset_question()
+        if self.ready:
+            self._show_question(self.ready.popleft())
+        else:
+            self.waiting = True
+            self.gen_btn.config(state=tk.DISABLED, text="生成中...")
+            self.question_label.config(text="AI 思考中，请稍候...", fg=ACCENT)
+        self._prefetch()
+
+    def _prefetch(self):
+        """补足后台任务：等待中的那道题加上 PREFETCH 道预取"""
+        target = PREFETCH + (1 if self.waiting else 0)
+        content = self.request_key[1]
+        while len(self.ready) + len(self.pending) < target:
+            future = self.executor.submit(self._generate, self.client, content)
+            self.pending.add(future)
+            generation = self.generation
+            future.add_done_callback(lambda f, g=generation: self._schedule(self._on_generated, g, f))
+
+    def _schedule(self, callback, *args):
+        """在后台线程里调用：把回调交给界面线程；窗口已关闭时直接丢弃"""
+        if self.closed:
+            return
+        try:
+            self.root.after(0, callback, *args)
+        except (RuntimeError, tk.TclError):
+            pass  # 检查之后窗口恰好被销毁
+
+    def _cancel_prefetch(self):
+        """输入或 API Key 变了：没开始的任务取消，进行中的结果到时丢弃"""
+        self.generation += 1
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.ready.clear()
+        if self.waiting:
+            # 正在等的那道题也作废了，恢复界面，由用户按新输入重新生成
+            self.waiting = False
+            self.gen_btn.config(state=tk.NORMAL, text="✨ 生成题目")
+            self.question_label.config(text="题目将在这里显示", fg="#4a5568")
+
+    def _on_input_changed(self, event=None):
+        self.input_text.edit_modified(False)
+        if self.request_key is None:
+            return
+        current = (self.key_entry.get().strip(), self.input_text.get("1.0", tk.END).strip())
+        if current != self.request_key:
+            self._cancel_prefetch()
+            self.request_key = None
+
+    def _generate(self, client, content):
+        """在后台线程里生成一道题，返回解析并校验过的字典"""
+        response = client.chat.completions.create(
+            model=MODEL,
+            max_tokens=1024,
+            messages=quiz_messages(content),
+            response_format=JSON_MODE
+        )
+        return validate_quiz(load_quiz(response.choices[0].message.content))
+
+    def _on_generated(self, generation, future):
+        if generation != self.generation or future.cancelled():
+            return
+        self.pending.discard(future)
         try:
-            client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                max_tokens=1024,
-                messages=[{"role": "user", "content": PROMPT_TEMPLATE.format(content=content)}]
-            )
-            raw = response.choices[0].message.content.strip()
-            start = raw.find("{")
-            end = raw.rfind("}") + 1
-            data = json.loads(raw[start:end])
-            self.root.after(0, self._show_question, data)
+            data = future.result()
         except json.JSONDecodeError:
-            self.root.after(0, self._show_error, "AI 返回格式异常，请重试")
+            error = "AI 返回格式异常，请重试"
         except Exception as e:
-            self.root.after(0, self._show_error, str(e))
+            error = str(e)
+        else:
+            if self.waiting:
+                self.waiting = False
+                self._show_question(data)
+            else:
+                self.ready.append(data)
+            self._prefetch()
+            return
+        # 预取失败不打扰用户，只有正在等的那道题才报错，也不再自动补任务
+        if self.waiting and not self.pending:
+            self.waiting = False
+            self._show_error(error)
+
+    def _close(self):
+        self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
 
     def _show_question(self, data):
         self.correct_answer = data["answer"].strip().upper()
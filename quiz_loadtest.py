@@ -0,0 +1,194 @@
+"""quiz_api 压测：按并发数或目标 RPS 打 /generate，统计吞吐、延迟分位数和错误率
+
+离线压测时先启动 quiz_mock_llm.py，再用 DEEPSEEK_BASE_URL 指向它启动 quiz_api：
+    python quiz_mock_llm.py --latency 1 &
+    DEEPSEEK_BASE_URL=http://127.0.0.1:9000 DEEPSEEK_API_KEY=mock python quiz_api.py &
+    python quiz_loadtest.py -c 20 -n 500 --topics 50 --save baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+# 这些设置不同时结果没有可比性，对比基线前先核对
+SETTING_KEYS = ("mode", "concurrency", "rps", "topics", "fresh", "stream")
+
+
+def percentile(values, p):
+    """最近秩法分位数，values 需已排序"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def send_one(client, payload, stream):
+    """发一个请求，返回 (状态, 总耗时, 首个事件耗时)；状态为 HTTP 状态码或异常名"""
+    start = time.perf_counter()
+    first = None
+    try:
+        if stream:
+            async with client.stream("POST", "/generate", json=payload) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        if first is None:
+                            first = time.perf_counter() - start
+                        if line == "event: error":
+                            status = "stream_error"
+        else:
+            response = await client.post("/generate", json=payload)
+            status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start, first
+
+
+def make_payload(args, i):
+    payload = {"content": f"{args.content} #{i % args.topics}" if args.topics else args.content,
+               "fresh": args.fresh, "stream": args.stream}
+    if args.api_key:
+        payload["api_key"] = args.api_key
+    return payload
+
+
+async def run_closed(client, args, results):
+    """闭环：concurrency 个工作协程各自发完一个再发下一个"""
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    counter = iter(range(args.requests if args.requests else sys.maxsize))
+
+    async def worker():
+        for i in counter:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            results.append(await send_one(client, make_payload(args, i), args.stream))
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+
+async def run_open(client, args, results):
+    """开环：按目标 RPS 定时发出请求，不等前一个完成"""
+    total = args.requests or int(args.rps * args.duration)
+    start = time.perf_counter()
+    tasks = []
+
+    async def fire(i):
+        results.append(await send_one(client, make_payload(args, i), args.stream))
+
+    for i in range(total):
+        delay = start + i / args.rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(fire(i)))
+    await asyncio.gather(*tasks)
+
+
+def summarize(results, elapsed):
+    statuses = Counter(str(status) for status, _, _ in results)
+    ok = sorted(latency for status, latency, _ in results if status == 200)
+    firsts = sorted(first for status, _, first in results if status == 200 and first is not None)
+    total = len(results)
+    report = {
+        "requests": total,
+        "ok": len(ok),
+        "error_rate": (total - len(ok)) / total if total else 0.0,
+        "statuses": dict(statuses),
+        "throughput": len(ok) / elapsed if elapsed else 0.0,
+        "elapsed": elapsed,
+    }
+    for p in (50, 95, 99):
+        report[f"p{p}_ms"] = 1000 * percentile(ok, p)
+    report["max_ms"] = 1000 * ok[-1] if ok else 0.0
+    if firsts:
+        report["first_event_p50_ms"] = 1000 * percentile(firsts, 50)
+        report["first_event_p95_ms"] = 1000 * percentile(firsts, 95)
+    return report
+
+
+def print_report(report):
+    print(f"请求 {report['requests']}，成功 {report['ok']}，错误率 {report['error_rate']:.1%}，"
+          f"用时 {report['elapsed']:.1f} 秒")
+    print(f"吞吐 {report['throughput']:.1f} 请求/秒")
+    print(f"延迟 p50 {report['p50_ms']:.0f} ms  p95 {report['p95_ms']:.0f} ms  "
+          f"p99 {report['p99_ms']:.0f} ms  最长 {report['max_ms']:.0f} ms")
+    if "first_event_p50_ms" in report:
+        print(f"首个事件 p50 {report['first_event_p50_ms']:.0f} ms  p95 {report['first_event_p95_ms']:.0f} ms")
+    print("状态码：" + "，".join(f"{k} × {v}" for k, v in sorted(report["statuses"].items())))
+
+
+def compare(report, baseline, tolerance):
+    """吞吐下降、分位延迟上升超过 tolerance，或错误率上升超过 1 个百分点视为退化"""
+    if any(baseline["settings"].get(k) != report["settings"].get(k) for k in SETTING_KEYS):
+        print("压测设置与基线不同，跳过对比")
+        return []
+    regressions = []
+    if report["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(f"吞吐 {baseline['throughput']:.1f} -> {report['throughput']:.1f}")
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        if report[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key} {baseline[key]:.0f} -> {report[key]:.0f}")
+    if report["error_rate"] > baseline["error_rate"] + 0.01:
+        regressions.append(f"错误率 {baseline['error_rate']:.1%} -> {report['error_rate']:.1%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="quiz_api 压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("-c", "--concurrency", type=int, default=10, help="闭环并发数")
+    parser.add_argument("--rps", type=float, default=None, help="给出时改为开环，按此速率发请求")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="请求总数，0 表示按 --duration")
+    parser.add_argument("-d", "--duration", type=float, default=None, help="压测时长（秒）")
+    parser.add_argument("--content", default="光合作用")
+    parser.add_argument("--topics", type=int, default=0, help="轮流使用多少种不同内容，0 表示全部相同")
+    parser.add_argument("--fresh", action="store_true", help="跳过服务端缓存")
+    parser.add_argument("--stream", action="store_true", help="使用 SSE 流式接口，额外统计首个事件耗时")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--save", metavar="JSON", help="把结果写成基线文件")
+    parser.add_argument("--compare", metavar="JSON", help="与基线文件对比，退化时返回非零")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="允许的相对退化幅度")
+    args = parser.parse_args(argv)
+    if not args.requests and not args.duration:
+        parser.error("--requests 为 0 时需要给出 --duration")
+    if args.rps is not None and args.rps <= 0:
+        parser.error("--rps 必须大于 0")
+
+    async def run():
+        results = []
+        limits = httpx.Limits(max_connections=None if args.rps else args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=120.0) as client:
+            start = time.perf_counter()
+            if args.rps:
+                await run_open(client, args, results)
+            else:
+                await run_closed(client, args, results)
+            return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+    report = summarize(results, elapsed)
+    report["settings"] = {"mode": "open" if args.rps else "closed",
+                          "concurrency": None if args.rps else args.concurrency, "rps": args.rps,
+                          "topics": args.topics, "fresh": args.fresh, "stream": args.stream}
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print("退化：" + line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
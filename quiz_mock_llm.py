@@ -0,0 +1,148 @@
+"""本地模拟的 OpenAI 兼容接口，用来离线压测 quiz_api，不消耗真实 token
+
+    python quiz_mock_llm.py --latency 1.5 --jitter 0.5 --error-rate 0.02 --malformed-rate 0.05
+    DEEPSEEK_BASE_URL=http://127.0.0.1:9000 python quiz_api.py
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+
+try:
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+    import uvicorn
+except ImportError:
+    print("请先安装依赖：")
+    print("  pip install fastapi uvicorn")
+    raise SystemExit
+
+
+class MockConfig:
+    latency = 1.0         # 完整生成一道题的平均耗时（秒）
+    jitter = 0.3          # 耗时在 ±jitter 内均匀抖动
+    error_rate = 0.0      # 返回 500 的比例
+    rate_limit_rate = 0.0  # 返回 429 的比例
+    malformed_rate = 0.0  # 返回无法解析的内容的比例
+    chunks = 20           # 流式响应分成多少块
+
+
+config = MockConfig()
+app = FastAPI(title="模拟 LLM 接口")
+
+
+def fake_quiz(topic, n):
+    return {
+        "question": f"关于「{topic[:20]}」的第 {n} 道模拟题，下列说法正确的是？",
+        "options": {"A": "模拟选项一", "B": "模拟选项二", "C": "模拟选项三", "D": "模拟选项四"},
+        "answer": random.choice("ABCD"),
+        "explanation": "这是模拟服务器生成的解析。" * 3,
+    }
+
+
+def completion_text(prompt):
+    """按提示词返回单题或多题 JSON，按 malformed_rate 故意弄坏"""
+    topic = prompt.rsplit("\n", 1)[-1]
+    match = re.search(r"生成 (\d+) 道", prompt)
+    if match:
+        data = [fake_quiz(topic, i + 1) for i in range(int(match.group(1)))]
+    else:
+        data = fake_quiz(topic, 1)
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    if random.random() < config.malformed_rate:
+        text = text[: len(text) // 2]
+    return text
+
+
+def usage(prompt, text):
+    # 粗略按字符数估算 token
+    prompt_tokens, completion_tokens = len(prompt), len(text)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def sample_latency():
+    return max(0.0, config.latency + random.uniform(-config.jitter, config.jitter))
+
+
+def fault():
+    """按配置的比例返回 429/500 错误响应，正常时返回 None"""
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return JSONResponse({"error": {"message": "模拟限流", "type": "rate_limit"}}, status_code=429,
+                            headers={"Retry-After": "1"})
+    if roll < config.rate_limit_rate + config.error_rate:
+        return JSONResponse({"error": {"message": "模拟服务错误", "type": "server_error"}}, status_code=500)
+    return None
+
+
+@app.post("/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    error = fault()
+    if error is not None:
+        await asyncio.sleep(min(0.05, config.latency))
+        return error
+
+    text = completion_text(prompt)
+    created = int(time.time())
+    model = body.get("model", "mock")
+    delay = sample_latency()
+    if not body.get("stream"):
+        await asyncio.sleep(delay)
+        return {
+            "id": "mock", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": usage(prompt, text),
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+    async def events():
+        size = max(1, len(text) // config.chunks)
+        for start in range(0, len(text), size):
+            await asyncio.sleep(delay / config.chunks)
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": text[start:start + size]},
+                                  "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        if include_usage:
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [], "usage": usage(prompt, text)}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟 OpenAI 兼容的聊天补全接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=MockConfig.latency, help="平均生成耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=MockConfig.jitter, help="耗时抖动幅度（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="返回坏 JSON 的比例")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config.latency = args.latency
+    config.jitter = args.jitter
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+    config.malformed_rate = args.malformed_rate
+    random.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""冷启动基准：在全新的子进程里测模块导入耗时，以及 python quiz_api.py 到 / 首次返回 200 的耗时"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODULES = ("quiz_core", "quiz_api")
+
+
+def import_time(module):
+    """在新进程里导入模块，返回耗时（秒）"""
+    code = ("import sys, time; sys.path.insert(0, %r); t = time.perf_counter(); "
+            "import %s; print(time.perf_counter() - t)" % (HERE, module))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_healthy(timeout=30.0):
+    """启动 quiz_api.py，轮询 / 直到返回 200，返回从启动进程算起的耗时（秒）"""
+    port = free_port()
+    env = dict(os.environ, PORT=str(port))
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "quiz_api.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"quiz_api.py 提前退出，返回码 {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"{timeout} 秒内没有就绪")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def stats(samples):
+    return {"median_ms": 1000 * statistics.median(samples), "min_ms": 1000 * min(samples),
+            "max_ms": 1000 * max(samples)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="quiz 冷启动基准测试")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="每项重复次数")
+    parser.add_argument("--save", metavar="JSON", help="把结果写成基线文件")
+    parser.add_argument("--compare", metavar="JSON", help="与基线文件对比，退化时返回非零")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化幅度")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for module in MODULES:
+        report[f"import {module}"] = stats([import_time(module) for _ in range(args.runs)])
+    report["first healthy /"] = stats([time_to_healthy() for _ in range(args.runs)])
+
+    for name, r in report.items():
+        print(f"{name:<20}中位 {r['median_ms']:7.0f} ms  最快 {r['min_ms']:7.0f} ms  最慢 {r['max_ms']:7.0f} ms")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = [f"{name} {baseline[name]['median_ms']:.0f} -> {r['median_ms']:.0f} ms"
+                       for name, r in report.items()
+                       if name in baseline and r["median_ms"] > baseline[name]["median_ms"] * (1 + args.tolerance)]
+        for line in regressions:
+            print("退化：" + line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())